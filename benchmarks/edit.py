@@ -0,0 +1,68 @@
+"""Measure running a large, generated dit again after small edits,
+against running the edited code from scratch.
+
+    python -m benchmarks.edit [--funcs 5000] [--repeat 3]
+
+One edit is made inside a function body and one between two functions,
+which are the two ways edit_dit keeps what was already lexed."""
+import argparse
+import time
+
+from dit_cli.cli import run_string
+from dit_cli.interpret_context import DIT_CACHES, edit_dit
+from dit_cli.lang_daemon import start_daemon
+
+
+def make_dit(funcs: int) -> str:
+    rows = []
+    for count in range(funcs):
+        rows.append(
+            f"Str name_{count} = 'record {count}';\n"
+            f"listOf Num series_{count} = [{count}, -{count}.5, 1e3];\n"
+            f"func f_{count}(Str a) {{|\n"
+            f"    Str s = 'v{count}';\n"
+            f"    listOf Str l = [a, s, '{count}'];\n"
+            f"|}}\n"
+            f"f_{count}(name_{count});\n"
+        )
+    return "".join(rows)
+
+
+def timed(code: str, path: str) -> float:
+    start = time.perf_counter()
+    run_string(code, path)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--funcs", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start_daemon()
+    code = make_dit(args.funcs)
+    fresh = edited = None
+    for attempt in range(args.repeat):
+        path = f"benchmark_edit_{attempt}.dit"
+        timed(code, path)
+        middle = code.index(f"func f_{args.funcs // 2}(")
+        inside = code.index("|}", middle)
+        between = code.index("\n", inside) + 1
+
+        start = time.perf_counter()
+        edit_dit(path, between, 0, "Num added = 1;\n")
+        new_code = edit_dit(path, inside, 0, "Str t = s;\n")
+        elapsed = time.perf_counter() - start + timed(new_code, path)
+        edited = elapsed if edited is None else min(edited, elapsed)
+
+        DIT_CACHES.pop(path)
+        elapsed = timed(new_code, path)
+        fresh = elapsed if fresh is None else min(fresh, elapsed)
+        DIT_CACHES.pop(path)
+    print(f"{len(code) / 1e6:.2f} MB, {args.funcs} funcs, best of {args.repeat}")
+    print(f"{fresh:.3f} s fresh, {edited:.3f} s edited and run again")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Measure raw lexing throughput on a large, generated data dit.
+
+    python -m benchmarks.lexer [--mb 4] [--repeat 3]
+
+Only the lexer is timed, not the interpreter. Every token is read the same way
+the interpreter reads it, including string contents and the rest of numbers."""
+import argparse
+import random
+import time
+
+from dit_cli.grammar import d_Grammar
+from dit_cli.interpret_context import TokenCache, lex_num, lex_str, lex_token
+from dit_cli.settings import LineIndex
+
+QUOTES = [d_Grammar.QUOTE_DOUBLE, d_Grammar.QUOTE_SINGLE]
+
+
+def make_dit(size: int) -> str:
+    rand = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta"]
+    rows = []
+    total = 0
+    count = 0
+    while total < size:
+        text = " ".join(rand.choice(words) for _ in range(rand.randint(3, 30)))
+        nums = ", ".join(str(rand.uniform(-1e4, 1e4)) for _ in range(20))
+        row = (
+            f"// record {count}\n"
+            f"Str name_{count} = 'record {count}: {text}';\n"
+            f"listOf Num series_{count} = [{nums}];\n"
+            f"/* flags */ Bool flag_{count} = {rand.choice(['true', 'false'])};\n"
+        )
+        rows.append(row)
+        total += len(row)
+        count += 1
+    return "".join(rows)
+
+
+def lex(view: memoryview) -> int:
+    cache = TokenCache(view, LineIndex.from_code(view.tobytes(), 1, 1))
+    count = 0
+    prev = None
+    while True:
+        tok = lex_token(cache)
+        count += 1
+        if tok.grammar == d_Grammar.EOF:
+            return count
+        elif tok.grammar in QUOTES:
+            lex_str(cache, tok)
+            lex_token(cache)  # the closing quote
+            count += 1
+        elif tok.grammar == d_Grammar.DIGIT:
+            lex_num(cache, tok, prev is not None and prev.grammar == d_Grammar.MINUS)
+        prev = tok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=float, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    code = make_dit(int(args.mb * 1024 * 1024)).encode()
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        tokens = lex(memoryview(code))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{len(code) / 1e6:.2f} MB, {tokens} tokens, best of {args.repeat}")
+    print(f"{best:.3f} s, {tokens / best:,.0f} tokens/s, {len(code) / best / 1e6:.2f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Measure the memory used to load a dit holding one large list.
+
+    python -m benchmarks.memory [--elements 1000000] [--type Num]
+
+Inst fills the list with instances made by a Make, half of their attrs
+assigned by a parent.
+
+Peak is the most memory allocated at once while the dit ran, retained is
+what the finished dit still holds. Both only count Python allocations."""
+import argparse
+import time
+import tracemalloc
+
+from dit_cli.interpreter import interpret
+from dit_cli.oop import d_Dit
+
+VALUES = {
+    "Num": lambda count: str(count * 0.5),
+    "Str": lambda count: f"'item {count}'",
+    "Bool": lambda count: "true" if count % 3 else "false",
+    "Inst": lambda count: f"Point({count}, {count * 2})",
+}
+
+POINT = """class Shape {|
+    func Make() {|
+        this.kind = 'shape';
+        this.sides = 0;
+    |}
+|}
+class Point {|
+    Parents = [Shape];
+    func Make(Num x, Num y) {|
+        this.x = x;
+        this.y = y;
+        this.Shape.Make();
+    |}
+|}
+"""
+
+
+def make_dit(elements: int, type_: str) -> str:
+    value = VALUES[type_]
+    items = ", ".join(value(count) for count in range(elements))
+    if type_ == "Inst":
+        return f"{POINT}listOf Point values = [{items}];\n"
+    return f"listOf {type_} values = [{items}];\n"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, default=1_000_000)
+    parser.add_argument("--type", choices=sorted(VALUES), default="Num")
+    args = parser.parse_args()
+
+    code = make_dit(args.elements, args.type)
+    dit = d_Dit.from_str("Main", code, "benchmark_memory.dit")
+    dit.finalize()
+    tracemalloc.start()
+    start = time.perf_counter()
+    interpret(dit)
+    elapsed = time.perf_counter() - start
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{len(code) / 1e6:.2f} MB, {args.elements} {args.type} elements")
+    print(f"{peak / 1e6:.1f} MB peak, {retained / 1e6:.1f} MB retained, {elapsed:.1f} s")
+    print(f"{retained / args.elements:.0f} bytes retained per element")
+
+
+if __name__ == "__main__":
+    main()
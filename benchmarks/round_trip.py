@@ -0,0 +1,59 @@
+"""Measure round trips between dit and a guest lang, using the Python guest
+in langs/python.dit.
+
+    python -m benchmarks.round_trip [--calls 200] [--callbacks 20]
+
+A call sends a function to the guest and waits for it to finish,
+a callback is a <| |> inside that function, sent back to dit to run.
+Starting the guest is timed on its own and taken out of both."""
+import argparse
+import os
+import time
+
+from dit_cli.cli import run_string
+from dit_cli.lang_daemon import start_daemon
+
+LANG = os.path.join(os.path.dirname(__file__), "..", "langs", "python.dit")
+
+
+def make_dit(calls: int, callbacks: int) -> str:
+    return (
+        f"pull Python from '{os.path.abspath(LANG)}';\n"
+        f"sig Python func guest(Num n) {{|\n"
+        f"    for i in range({callbacks}):\n"
+        f"        <|n|>\n"
+        f"|}}\n"
+        # The first call starts the guest
+        f"guest(0);\n" + "guest(1);\n" * calls
+    )
+
+
+def timed(code: str, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_string(code, "benchmark_round_trip.dit")
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best  # type: ignore
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--callbacks", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    start_daemon()
+    startup = timed(make_dit(0, 0), args.repeat)
+    calls = timed(make_dit(args.calls, 0), args.repeat) - startup
+    callbacks = timed(make_dit(args.calls, args.callbacks), args.repeat)
+    callbacks -= startup + calls
+    print(f"{startup * 1e3:.0f} ms to start the guest")
+    print(f"{calls / args.calls * 1e3:.3f} ms per call")
+    print(f"{callbacks / (args.calls * args.callbacks) * 1e3:.3f} ms per callback")
+
+
+if __name__ == "__main__":
+    main()
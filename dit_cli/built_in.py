@@ -2,7 +2,7 @@ import os
 from typing import List
 
 import dit_cli.settings
-from dit_cli.grammar import d_Grammar
+from dit_cli.grammar import NameRegistry, d_Grammar
 from dit_cli.oop import Declarable, d_Dit, d_Func, d_Lang
 
 b_Ditlang = d_Lang()
@@ -56,4 +56,4 @@ b_get_config.is_null = False
 b_get_config.lang = b_Ditlang
 
 
-BUILT_INS = [b_print, b_get_config, b_Ditlang]
+BUILT_INS = NameRegistry([b_print, b_get_config, b_Ditlang])
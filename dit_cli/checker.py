@@ -0,0 +1,264 @@
+"""Checks dit files for syntax errors, without running anything.
+
+Dit is interpreted straight from its tokens, so there is no separate parse
+to run on its own. A check covers everything that can be known before a dit
+runs: every token, string, number, and comment, matching bar braces and
+brackets, and the bodies of classes, langs, and Ditlang functions.
+Functions that might belong to a guest lang are left alone, since only
+running the dit can tell which lang a name refers to, and so are functions
+declared in a lang, which hold the guest's code."""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, List, Optional, Set, Tuple
+
+from dit_cli.exceptions import (
+    d_DitError,
+    d_EndOfClangError,
+    d_EndOfFileError,
+    d_SyntaxError,
+)
+from dit_cli.grammar import TYPES, d_Grammar
+from dit_cli.interpret_context import (
+    BodySpan,
+    TokenCache,
+    lex_body,
+    lex_num,
+    lex_sign,
+    lex_str,
+    lex_token,
+)
+from dit_cli.oop import Token, d_Dit
+from dit_cli.settings import LineIndex
+
+OPENERS = {
+    d_Grammar.PAREN_LEFT: d_Grammar.PAREN_RIGHT,
+    d_Grammar.BRACKET_LEFT: d_Grammar.BRACKET_RIGHT,
+    d_Grammar.BRACE_LEFT: d_Grammar.BRACE_RIGHT,
+}
+CLOSERS = set(OPENERS.values())
+CLANGS = {d_Grammar.CLASS: "class", d_Grammar.LANG: "lang"}
+# Everything that can be in a sig, between 'sig' and 'func'
+SIG_PARTS = {d_Grammar.WORD, d_Grammar.DOT, d_Grammar.LISTOF, d_Grammar.VOID, *TYPES}
+
+
+class CheckContext:
+    def __init__(self, follow_imports: bool) -> None:
+        self.follow_imports: bool = follow_imports
+        self.checked: Set[str] = set()  # every path checked so far
+        # Names declared by 'class' in the dit being checked
+        self.classes: Set[str] = set()
+        # Function bodies, checked once the rest of the dit is done,
+        # along with the names in their sig
+        self.funcs: List[Tuple[BodySpan, List[str]]] = []
+
+
+def check_dit(path: str, follow_imports: bool = False) -> Optional[str]:
+    """Check the dit at path, and every dit it imports if follow_imports.
+    Returns the trace of the first syntax error found, or None."""
+    dit = d_Dit()
+    dit.path = path
+    try:
+        dit.handle_filepath()
+        _check_dit(CheckContext(follow_imports), dit)
+    except d_DitError as err:
+        return err.get_cli_trace()
+    return None
+
+
+def check_string(
+    dit_string: str, path: str, follow_imports: bool = False
+) -> Optional[str]:
+    """Check dit code as if it was read from path"""
+    dit = d_Dit()
+    dit.path = path
+    dit.view = memoryview(dit_string.encode())
+    try:
+        _check_dit(CheckContext(follow_imports), dit)
+    except d_DitError as err:
+        return err.get_cli_trace()
+    return None
+
+
+def _check_dit(check: CheckContext, dit: d_Dit) -> None:
+    check.checked.add(dit.path)
+    outer = (check.classes, check.funcs)
+    check.classes, check.funcs = set(), []
+    try:
+        code = dit.view.tobytes()
+        lines = LineIndex.from_code(code, dit.start_loc.col, dit.start_loc.line)
+        _check_body(check, TokenCache(dit.view, lines), dit.path)
+        for span, names in check.funcs:
+            if all(name in check.classes for name in names):
+                _check_body(check, span.token_cache, dit.path)
+    finally:
+        check.classes, check.funcs = outer
+
+
+def _check_body(check: CheckContext, cache: TokenCache, path: str) -> None:
+    if len(cache.view) == 0:
+        return  # Just like interpret, an empty body has nothing to read
+    tokens: List[Token] = []
+    # Indexes of the brackets still open, and of the ( that matched the last )
+    opened: List[int] = []
+    last_paren = -1
+    link: Optional[str] = None
+    try:
+        while True:
+            tok = cache.lex(lex_token)
+            tokens.append(tok)
+            if link is not None:
+                # Like a run, the import happens once the token after it is read
+                _check_import(check, link, tokens)
+                link = None
+            gra = tok.grammar
+            if gra == d_Grammar.EOF:
+                break
+            elif gra in OPENERS:
+                opened.append(len(tokens) - 1)
+            elif gra in CLOSERS:
+                if not opened or OPENERS[tokens[opened[-1]].grammar] != gra:
+                    raise d_SyntaxError(f"Unexpected '{gra.value}'", tok.loc)
+                last_paren = opened.pop()
+            elif gra in [d_Grammar.QUOTE_DOUBLE, d_Grammar.QUOTE_SINGLE]:
+                string = cache.lex(lex_str, tok)
+                if check.follow_imports and _is_link(tokens):
+                    link = string
+                tokens.append(cache.lex(lex_token))  # the closing quote
+            elif gra in [d_Grammar.PLUS, d_Grammar.MINUS]:
+                missing_loc = cache.lex(lex_sign)
+                if missing_loc is not None:
+                    raise d_SyntaxError(
+                        "Expected digit.\nOther arithmetic ops are not yet supported.",
+                        missing_loc,
+                    )
+            elif gra == d_Grammar.DIGIT:
+                neg = len(tokens) > 1 and tokens[-2].grammar == d_Grammar.MINUS
+                cache.lex(lex_num, tok, neg)
+            elif gra == d_Grammar.BAR_BRACE_LEFT:
+                span: BodySpan = cache.lex(lex_body, tok)
+                tokens.extend(span.tokens)
+                _check_span(check, span, tokens, last_paren, path)
+        if opened:
+            tok = tokens[opened[-1]]
+            raise d_SyntaxError(f"'{tok.grammar.value}' was never closed", tok.loc)
+    except d_DitError as err:
+        if not err.origin:
+            if not err.loc:
+                # Wherever the interpreter would have been when lexing failed
+                err.loc = tokens[-1].loc if tokens else cache.loc
+            err.set_origin(path, cache.get_line(err.loc))
+        raise
+
+
+def _check_span(
+    check: CheckContext,
+    span: BodySpan,
+    tokens: List[Token],
+    last_paren: int,
+    path: str,
+) -> None:
+    # The body's own tokens have just been added after the {|
+    index = len(tokens) - len(span.tokens) - 2
+    if index < 0:
+        return
+    before = tokens[index]
+    if before.grammar == d_Grammar.WORD and index > 0:
+        # class/lang NAME {|
+        if tokens[index - 1].grammar == d_Grammar.CLASS:
+            check.classes.add(before.word)  # type: ignore
+        before = tokens[index - 1]
+    if before.grammar in CLANGS:
+        funcs = check.funcs
+        if before.grammar == d_Grammar.LANG:
+            # Functions in a lang, like guest_daemon, hold the guest's own code
+            check.funcs = []
+        # Classes and langs are interpreted as soon as they are declared
+        try:
+            _check_body(check, span.token_cache, path)
+        except d_EndOfFileError as err:
+            raise d_EndOfClangError(CLANGS[before.grammar]) from err
+        finally:
+            check.funcs = funcs
+    elif before.grammar == d_Grammar.PAREN_RIGHT:
+        _defer_func(check, span, tokens, last_paren)
+
+
+def _defer_func(
+    check: CheckContext, span: BodySpan, tokens: List[Token], paren: int
+) -> None:
+    # sig ... func NAME(...) {|
+    index = paren - 1
+    if index >= 0 and tokens[index].grammar == d_Grammar.WORD:
+        index -= 1
+    if index < 0 or tokens[index].grammar != d_Grammar.FUNC:
+        return
+    func = index
+    while index > 0 and tokens[index - 1].grammar in SIG_PARTS:
+        index -= 1
+    names: List[str] = []
+    if index > 0 and tokens[index - 1].grammar == d_Grammar.SIG:
+        for tok in tokens[index:func]:
+            if tok.grammar == d_Grammar.DOT:
+                return  # A name from another dit, which could be any lang
+            elif tok.grammar == d_Grammar.WORD and tok.word != "Ditlang":
+                names.append(tok.word)  # type: ignore
+    check.funcs.append((span, names))
+
+
+def _is_link(tokens: List[Token]) -> bool:
+    # import "LINK"
+    # import NAME from "LINK"
+    # pull ... from "LINK"
+    if len(tokens) < 2:
+        return False
+    return tokens[-2].grammar in [d_Grammar.IMPORT, d_Grammar.FROM]
+
+
+def _check_import(check: CheckContext, link: str, tokens: List[Token]) -> None:
+    if link in check.checked:
+        return
+    # The import or pull that started this statement
+    start = len(tokens) - 1
+    while start > 0 and tokens[start].grammar not in [
+        d_Grammar.IMPORT,
+        d_Grammar.PULL,
+    ]:
+        start -= 1
+    dit = d_Dit()
+    dit.path = link
+    # A dit that can't be read is an error at the import itself, just like in
+    # a run, while an error inside the dit is traced back to the import
+    dit.handle_filepath()
+    try:
+        _check_dit(check, dit)
+    except d_DitError as err:
+        err.add_trace(link, tokens[start].loc, "import")
+        raise
+
+
+def check_dits(
+    paths: List[str], follow_imports: bool = False, jobs: Optional[int] = None
+) -> int:
+    """Check every path, spread over jobs worker processes, and print the trace
+    of every syntax error found. Returns how many dits had an error."""
+    check = partial(check_dit, follow_imports=follow_imports)
+    if jobs == 1 or len(paths) == 1:
+        return _print_traces(map(check, paths))
+    jobs = jobs or os.cpu_count() or 1
+    # Big enough chunks that workers don't spend their time waiting on each other
+    chunksize = max(1, len(paths) // (4 * jobs))
+    with ProcessPoolExecutor(jobs) as executor:
+        return _print_traces(executor.map(check, paths, chunksize=chunksize))
+
+
+def _print_traces(traces: Iterable[Optional[str]]) -> int:
+    errors = 0
+    for trace in traces:
+        if trace is not None:
+            if errors:
+                print()
+            print(trace)
+            errors += 1
+    return errors
@@ -4,7 +4,9 @@ import sys
 
 import dit_cli.settings
 from dit_cli import __version__
+from dit_cli.checker import check_dits
 from dit_cli.exceptions import d_DitError
+from dit_cli.interpret_context import save_dit_caches
 from dit_cli.interpreter import interpret
 from dit_cli.lang_daemon import kill_all, start_daemon
 from dit_cli.oop import d_Dit
@@ -15,14 +17,53 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("-v", "--version", action="version", version=__version__)
     parser.add_argument(
-        "filepath", nargs="?", type=argparse.FileType("r"), default=sys.stdin
+        "filepath", nargs="*", help="the dit to run, or every dit to --check"
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help=f"don't read or write lexed dits in {dit_cli.settings.DEFAULT_CACHE_DIR}",
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="only check for syntax errors, without running anything",
+    )
+    parser.add_argument(
+        "--follow-imports",
+        action="store_true",
+        help="with --check, also check every dit that is imported",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="with --check, how many processes to check with (default: all CPUs)",
     )
     args = parser.parse_args()
-    if sys.stdin.isatty() and args.filepath.name == "<stdin>":
+    if args.check:
+        if not args.filepath:
+            parser.error("must provide at least one filepath to check")
+        errors = check_dits(args.filepath, args.follow_imports, args.jobs)
+        sys.exit(1 if errors else 0)
+
+    if len(args.filepath) > 1:
+        parser.error("can only run one filepath at a time, unless using --check")
+    elif args.filepath:
+        try:
+            file_object = argparse.FileType("r")(args.filepath[0])
+        except argparse.ArgumentTypeError as err:
+            parser.error(str(err))
+    else:
+        file_object = sys.stdin
+    if sys.stdin.isatty() and file_object.name == "<stdin>":
         parser.error("must provide one of filepath or stdin pipe")
-    code = args.filepath.read()
+    code = file_object.read()
+    if not args.no_cache:
+        dit_cli.settings.CACHE_DIR = dit_cli.settings.DEFAULT_CACHE_DIR
     start_daemon()
-    run_string(code, args.filepath.name)
+    run_string(code, file_object.name)
 
 
 def run_string(dit_string: str, path: str):
@@ -35,6 +76,7 @@ def run_string(dit_string: str, path: str):
         final = err.get_cli_trace()
         print(final)
     finally:
+        save_dit_caches()
         kill_all()
 
 
@@ -0,0 +1,73 @@
+"""Keeps the lexed form of dit files on disk, so that files imported by many
+scripts, like commonLangs.dit, are only lexed once across every run.
+Much like __pycache__, each source gets one cache file, which is replaced
+whenever the contents of that source change."""
+
+import gc
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Any, Optional
+
+import dit_cli.settings
+from dit_cli import __version__
+
+# The layout of what is pickled: TokenCache, and the Token, CodeLocation,
+# LineIndex, BraceIndex and BodySpan it holds. Bump this whenever any of them
+# change, since a cache of the old layout would still load, then fail mid-run.
+FORMAT = 1
+
+
+def load(source: str, code: bytes) -> Optional[Any]:
+    """Load what was saved for source, if it was saved from this exact code.
+    A missing, stale, or unreadable cache file is the same as no cache."""
+    if dit_cli.settings.CACHE_DIR is None:
+        return None
+    # Loading makes many small objects and no cycles to collect,
+    # so the garbage collector would only slow it down
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(_cache_path(source), "rb") as file_object:
+            digest, obj = pickle.load(file_object)
+    except Exception:
+        # Any kind of corrupt file just means lexing again
+        return None
+    finally:
+        if enabled:
+            gc.enable()
+    return obj if digest == _digest(code) else None
+
+
+def save(source: str, code: bytes, obj: Any) -> None:
+    """Save obj for source. Failing to save is never an error,
+    since the cache is only ever an optimization."""
+    if dit_cli.settings.CACHE_DIR is None:
+        return
+    try:
+        os.makedirs(dit_cli.settings.CACHE_DIR, exist_ok=True)
+        data = pickle.dumps((_digest(code), obj), pickle.HIGHEST_PROTOCOL)
+        # Many dit scripts may be run at once, so the file is swapped in whole
+        handle, tmp = tempfile.mkstemp(dir=dit_cli.settings.CACHE_DIR)
+    except (OSError, pickle.PicklingError, RecursionError):
+        return
+    try:
+        with os.fdopen(handle, "wb") as file_object:
+            file_object.write(data)
+        os.replace(tmp, _cache_path(source))
+    except OSError:
+        os.remove(tmp)
+
+
+def _cache_path(source: str) -> str:
+    if "://" not in source:
+        source = os.path.abspath(source)
+    name = hashlib.sha1(source.encode()).hexdigest()
+    return os.path.join(dit_cli.settings.CACHE_DIR, name + ".pickle")  # type: ignore
+
+
+def _digest(code: bytes) -> str:
+    # A new version of dit may lex differently, even for the same code
+    key = f"{__version__}\0{FORMAT}\0".encode()
+    return hashlib.sha256(key + code).hexdigest()
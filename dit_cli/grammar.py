@@ -1,5 +1,6 @@
 """All fundamental grammatical concepts in dit, with their string representations"""
 from enum import Enum
+from typing import Any, Dict, Iterable, List
 
 
 class d_Grammar(Enum):
@@ -235,6 +236,24 @@ TYPES = [
     d_Grammar.PRIMITIVE_LANG,
 ]
 
+# Every token that can appear in a list or JSON made only of literal values
+LITERALS = [
+    d_Grammar.QUOTE_DOUBLE,
+    d_Grammar.QUOTE_SINGLE,
+    d_Grammar.DIGIT,
+    d_Grammar.PLUS,
+    d_Grammar.MINUS,
+    d_Grammar.TRUE,
+    d_Grammar.FALSE,
+    d_Grammar.NULL,
+    d_Grammar.COMMA,
+    d_Grammar.COLON,
+    d_Grammar.BRACKET_LEFT,
+    d_Grammar.BRACKET_RIGHT,
+    d_Grammar.BRACE_LEFT,
+    d_Grammar.BRACE_RIGHT,
+]
+
 DOUBLES = [
     d_Grammar.TRI_LEFT,
     d_Grammar.TRI_RIGHT,
@@ -294,3 +313,62 @@ KEYWORDS = [
     d_Grammar.PRIMITIVE_DIT,
     d_Grammar.PRIMITIVE_LANG,
 ]
+
+# Lookup tables for the lexer, so each token is found with a single dict probe
+DOUBLE_LOOKUP: Dict[str, d_Grammar] = {grammar.value: grammar for grammar in DOUBLES}
+SINGLE_LOOKUP: Dict[str, d_Grammar] = {grammar.value: grammar for grammar in SINGLES}
+KEYWORD_LOOKUP: Dict[str, d_Grammar] = {grammar.value: grammar for grammar in KEYWORDS}
+
+
+class NameRegistry(List[Any]):
+    """A list of named things, such as the built-ins, that keeps itself indexed.
+    Anything added to the list can immediately be found by name in lookup,
+    so registering a new built-in is just a matter of appending it.
+    If two things share a name, the first one in the list wins."""
+
+    def __init__(self, things: Iterable[Any] = ()) -> None:
+        super().__init__(things)
+        self.lookup: Dict[str, Any] = {}
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.lookup = {}
+        for thing in self:
+            self.lookup.setdefault(thing.name, thing)
+
+    def append(self, thing: Any) -> None:
+        super().append(thing)
+        self._reindex()
+
+    def extend(self, things: Iterable[Any]) -> None:
+        super().extend(things)
+        self._reindex()
+
+    def insert(self, index: Any, thing: Any) -> None:
+        super().insert(index, thing)
+        self._reindex()
+
+    def remove(self, thing: Any) -> None:
+        super().remove(thing)
+        self._reindex()
+
+    def pop(self, index: Any = -1) -> Any:
+        thing = super().pop(index)
+        self._reindex()
+        return thing
+
+    def clear(self) -> None:
+        super().clear()
+        self._reindex()
+
+    def __setitem__(self, index: Any, thing: Any) -> None:
+        super().__setitem__(index, thing)
+        self._reindex()
+
+    def __delitem__(self, index: Any) -> None:
+        super().__delitem__(index)
+        self._reindex()
+
+    def __iadd__(self, things: Iterable[Any]) -> "NameRegistry":
+        self.extend(things)
+        return self
@@ -0,0 +1,194 @@
+"""The binary encoding for messages between the lang daemon and a guest,
+which a guest can ask for in its connect message instead of JSON.
+
+Messages are still framed by their length, see FRAME_HEADER in oop.py.
+A message starts with one byte, the index of its type in JobType,
+then the id of its job, 4 bytes.
+One from the daemon then has the function's id, 4 bytes, and a byte that is 1
+the first time the id is sent on a connection, followed by the function's
+name and path as strings. Guests keep these, so later messages only send
+the id. Last is the result, as a value. A message from a guest has only its
+type, job id and result.
+
+A value is a one byte tag and what follows it, all numbers big-endian:
+    n, t, f     null, true, false
+    i           an 8 byte signed int
+    b           an int too big for i, as a string of its decimal digits
+    d           an 8 byte float
+    s           a 4 byte length, then that many bytes of UTF-8
+    l           a 4 byte count, then that many values
+    m           a 4 byte count, then that many pairs of a key and a value,
+                each key a string without its tag
+    I, D        a 4 byte count, then that many ints or floats, packed as
+                with i or d
+    S           a 4 byte count, then the byte length of each string, 4 bytes
+                each, then all of their UTF-8
+I, D and S are used for lists that hold only ints, floats or strings,
+which are the lists big enough for the encoding to matter."""
+import struct
+import sys
+from array import array
+from itertools import accumulate
+from typing import Any, List, Tuple
+
+from dit_cli.exceptions import d_CriticalError
+from dit_cli.oop import GuestDaemonJob, JobType
+
+MESSAGE_TYPES: List[JobType] = list(JobType)
+TYPE_CODES = {type_: code for code, type_ in enumerate(MESSAGE_TYPES)}
+COUNT = struct.Struct(">I")
+INT = struct.Struct(">q")
+FLOAT = struct.Struct(">d")
+# Packed lists are always sent big-endian
+SWAP = sys.byteorder == "little"
+
+
+def encode_job(job: GuestDaemonJob, func_id: int, define: bool) -> bytes:
+    out = bytearray((TYPE_CODES[job.type_],))
+    out += COUNT.pack(job.id_)
+    out += COUNT.pack(func_id)
+    out.append(define)
+    if define:
+        _encode_str(job.func.name, out)
+        _encode_str(job.func.guest_func_path, out)
+    encode_value(job.result, out)
+    return bytes(out)
+
+
+def decode_message(payload: bytes) -> dict:
+    """Read a message from a guest into the same dict its JSON would have"""
+    if not payload or payload[0] >= len(MESSAGE_TYPES):
+        raise d_CriticalError("Unrecognized job type")
+    view = memoryview(payload)
+    (job_id,) = COUNT.unpack_from(view, 1)
+    result, end = decode_value(view, 1 + COUNT.size)
+    if end != len(payload):
+        raise d_CriticalError("Binary message from guest has extra bytes")
+    return {"type": MESSAGE_TYPES[payload[0]].value, "id": job_id, "result": result}
+
+
+def encode_value(value: Any, out: bytearray) -> None:
+    # bool is checked before int, since True is also an int
+    if value is None:
+        out += b"n"
+    elif value is True:
+        out += b"t"
+    elif value is False:
+        out += b"f"
+    elif isinstance(value, int):
+        if -(1 << 63) <= value < 1 << 63:
+            out += b"i" + INT.pack(value)
+        else:
+            out += b"b"
+            _encode_str(str(value), out)
+    elif isinstance(value, float):
+        out += b"d" + FLOAT.pack(value)
+    elif isinstance(value, str):
+        out += b"s"
+        _encode_str(value, out)
+    elif isinstance(value, list):
+        _encode_list(value, out)
+    elif isinstance(value, dict):
+        out += b"m" + COUNT.pack(len(value))
+        for key, item in value.items():
+            _encode_str(key, out)
+            encode_value(item, out)
+    else:
+        raise d_CriticalError(f"Cannot encode {type(value).__name__} for a guest")
+
+
+def decode_value(view: memoryview, pos: int) -> Tuple[Any, int]:
+    """Read the value starting at pos, and return it with the position after it"""
+    tag = chr(view[pos])
+    pos += 1
+    if tag == "n":
+        return None, pos
+    elif tag == "t":
+        return True, pos
+    elif tag == "f":
+        return False, pos
+    elif tag == "i":
+        return INT.unpack_from(view, pos)[0], pos + 8
+    elif tag == "d":
+        return FLOAT.unpack_from(view, pos)[0], pos + 8
+    elif tag == "s":
+        return _decode_str(view, pos)
+    elif tag == "b":
+        digits, pos = _decode_str(view, pos)
+        return int(digits), pos
+    (count,) = COUNT.unpack_from(view, pos)
+    pos += 4
+    if tag == "l":
+        items = []
+        for _ in range(count):
+            item, pos = decode_value(view, pos)
+            items.append(item)
+        return items, pos
+    elif tag == "m":
+        pairs = {}
+        for _ in range(count):
+            key, pos = _decode_str(view, pos)
+            pairs[key], pos = decode_value(view, pos)
+        return pairs, pos
+    elif tag in ("I", "D"):
+        packed = array("q" if tag == "I" else "d")
+        end = pos + count * 8
+        packed.frombytes(view[pos:end])
+        if SWAP:
+            packed.byteswap()
+        return packed.tolist(), end
+    elif tag == "S":
+        return _decode_strs(view, pos, count)
+    raise d_CriticalError(f"Unrecognized value tag {tag!r} from guest")
+
+
+def _encode_list(values: list, out: bytearray) -> None:
+    if values:
+        first = type(values[0])
+        if first in (int, float) and all(type(item) is first for item in values):
+            try:
+                packed = array("q" if first is int else "d", values)
+            except OverflowError:
+                pass  # An int too big for 8 bytes
+            else:
+                if SWAP:
+                    packed.byteswap()
+                out += (b"I" if first is int else b"D") + COUNT.pack(len(values))
+                out += packed.tobytes()
+                return
+        elif first is str and all(type(item) is str for item in values):
+            raws = [item.encode() for item in values]
+            sizes = struct.pack(f">{len(raws)}I", *map(len, raws))
+            out += b"S" + COUNT.pack(len(values)) + sizes
+            out += b"".join(raws)
+            return
+    out += b"l" + COUNT.pack(len(values))
+    for item in values:
+        encode_value(item, out)
+
+
+def _encode_str(value: str, out: bytearray) -> None:
+    raw = value.encode()
+    out += COUNT.pack(len(raw))
+    out += raw
+
+
+def _decode_str(view: memoryview, pos: int) -> Tuple[str, int]:
+    (size,) = COUNT.unpack_from(view, pos)
+    pos += 4
+    return str(view[pos : pos + size], "utf-8"), pos + size
+
+
+def _decode_strs(view: memoryview, pos: int, count: int) -> Tuple[List[str], int]:
+    # struct, unlike array, always reads the sizes as 4 bytes
+    sizes = struct.unpack_from(f">{count}I", view, pos)
+    start = pos + count * 4
+    ends = list(accumulate(sizes))
+    end = start + (ends[-1] if ends else 0)
+    text = str(view[start:end], "utf-8")
+    starts = [0] + ends[:-1]
+    if len(text) == end - start:
+        # Only ASCII, so each string can be sliced from the text by its bytes
+        return [text[a:b] for a, b in zip(starts, ends)], end
+    raw = view[start:end]
+    return [str(raw[a:b], "utf-8") for a, b in zip(starts, ends)], end
@@ -1,12 +1,37 @@
-import copy
 import re
-from typing import Optional
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+from dit_cli import disk_cache
 from dit_cli.built_in import BUILT_INS
-from dit_cli.exceptions import d_EndOfFileError, d_SyntaxError
-from dit_cli.grammar import DOUBLES, KEYWORDS, SINGLES, d_Grammar
-from dit_cli.oop import Declarable, Token, d_Body, d_Container, d_Func, d_Inst
-from dit_cli.settings import CodeLocation
+from dit_cli.exceptions import (
+    d_CriticalError,
+    d_DitError,
+    d_EndOfFileError,
+    d_SyntaxError,
+)
+from dit_cli.grammar import (
+    DOUBLE_LOOKUP,
+    KEYWORD_LOOKUP,
+    LITERALS,
+    SINGLE_LOOKUP,
+    d_Grammar,
+)
+from dit_cli.oop import (
+    Declarable,
+    Lookup,
+    PackedValues,
+    Token,
+    d_Body,
+    d_Container,
+    d_Dit,
+    d_Func,
+    d_Inst,
+    d_List,
+    d_Thing,
+)
+from dit_cli.settings import CodeLocation, LineIndex
 
 
 class CharFeed:
@@ -58,13 +83,549 @@ class CharFeed:
         return self._dev().lstrip().startswith(value)
 
 
-class InterpretContext:
-    def __init__(self, body: d_Body) -> None:
+class BraceIndex:
+    """Every {| and |} in a source buffer, and which ones match, found in a single
+    pass that skips over strings and comments. Declaring a body is then just a
+    lookup, instead of a scan that is repeated for every level of nesting.
+    Nested bodies share the index of the code they were sliced from,
+    and only know the pos where they start in their parent."""
+
+    def __init__(
+        self,
+        braces: List[int],
+        pairs: Dict[int, int],
+        parent: Optional["BraceIndex"] = None,
+        start: int = 0,
+    ) -> None:
+        self.braces: List[int] = braces  # pos of every bar brace, in order
+        self.pairs: Dict[int, int] = pairs  # {| pos -> |} pos, or -1 if unclosed
+        self.parent: Optional[BraceIndex] = parent
+        self.start: int = start  # pos in the parent where this starts
+
+    @classmethod
+    def from_code(cls, code: bytes) -> "BraceIndex":
+        braces = _scan_braces(code, 0)
+        return cls(braces, _pair_braces(code, braces))
+
+    @property
+    def offset(self) -> int:
+        """pos in the outermost code where this starts"""
+        if self.parent is None:
+            return self.start
+        return self.parent.offset + self.start
+
+    def nested(self, pos: int) -> "BraceIndex":
+        """The index for a slice of this code, starting at pos"""
+        return BraceIndex(self.braces, self.pairs, self, pos)
+
+    def find_close(self, pos: int) -> Optional[int]:
+        """The pos of the |} matching the {| at pos, -1 if it is never closed,
+        or None if the {| is not in the index at all."""
+        offset = self.offset
+        close = self.pairs.get(pos + offset)
+        if close is None or close == -1:
+            return close
+        return close - offset
+
+    def last_inside(self, start: int, end: int, count: int) -> List[int]:
+        """The pos of the last few bar braces after start and before end"""
+        offset = self.offset
+        lo = bisect_right(self.braces, start + offset)
+        hi = bisect_left(self.braces, end + offset)
+        return [brace - offset for brace in self.braces[max(lo, hi - count) : hi]]
+
+    def edit(self, code: bytes, offset: int, removed: int, added: int) -> None:
+        """Update the outermost index in place, after removed bytes at offset
+        were replaced by added bytes, giving code.
+        The scan from any bar brace on is always the same, so it restarts at
+        a bar brace before the edit, and stops at the first bar brace after it
+        that was also found before the edit. A quote before the restart could
+        have been closed by the edit, unless the line it is on ended first."""
+        braces = self.braces
+        delta = added - removed
+        newline = code.rfind(b"\n", 0, offset)
+        while newline > 0 and code[newline - 1] == BACKSLASH:
+            newline = code.rfind(b"\n", 0, newline)
+        first = bisect_left(braces, newline) - 1
+        if first < 0:
+            first, scan_from = 0, 0
+        else:
+            scan_from = braces[first]
+        scanned: List[int] = []
+        tail: List[int] = []
+        for pos in _iter_braces(code, scan_from):
+            if pos >= offset + added:
+                old = bisect_left(braces, pos - delta)
+                if old < len(braces) and braces[old] == pos - delta:
+                    tail = [brace + delta for brace in braces[old:]]
+                    break
+            scanned.append(pos)
+        braces[first:] = scanned + tail
+        self.pairs.clear()
+        self.pairs.update(_pair_braces(code, braces))
+
+
+def _iter_braces(code: bytes, pos: int) -> Iterator[int]:
+    for found in BRACE_SCAN.finditer(code, pos):
+        if found.lastindex:
+            yield found.start()
+
+
+def _scan_braces(code: bytes, pos: int) -> List[int]:
+    return list(_iter_braces(code, pos))
+
+
+def _pair_braces(code: bytes, braces: List[int]) -> Dict[int, int]:
+    pairs: Dict[int, int] = {}
+    opened: List[int] = []
+    for pos in braces:
+        if code[pos] == BRACE:
+            opened.append(pos)
+            pairs[pos] = -1
+        elif opened:
+            pairs[opened.pop()] = pos
+    return pairs
+
+
+BRACE = ord("{")
+BACKSLASH = ord("\\")
+# Strings end at a newline, just like in lex_str, unless it is escaped.
+# An unclosed quote is just a char, so that apostrophes in guest code comments
+# don't hide the braces after them.
+STRING = rb"\"(?:[^\"\\\n]|\\[\s\S])*\"|'(?:[^'\\\n]|\\[\s\S])*'"
+# Just like the lexer, a /* comment is closed by the first */ starting on the *,
+# so /*/ is a whole comment.
+COMMENT = rb"/(?=\*)[\s\S]*?\*/|/\*[\s\S]*|//[^\n]*"
+# Everything else, in as few matches as possible, since only braces are kept
+FILLER = rb"(?:[^{|/'\"]+|%s|\{(?!\|)|\|(?!\})|/(?![/*])|['\"])+" % STRING
+BRACE_SCAN = re.compile(rb"(\{\||\|\})|%s|%s" % (COMMENT, FILLER))
+
+
+GRAMMARS: List[d_Grammar] = list(d_Grammar)
+GRAMMAR_CODES: Dict[d_Grammar, int] = {gra: i for i, gra in enumerate(GRAMMARS)}
+
+
+@dataclass
+class BodySpan:
+    """The result of skipping over a {| |} body.
+    tokens are the last bar braces inside it, and the |} that ends it,
+    so that the interpreter sees the same tokens on every replay.
+    token_cache is shared by every body declared from this span."""
+
+    start_loc: CodeLocation
+    end_loc: CodeLocation
+    tokens: List[Token]
+    view: memoryview
+    token_cache: "TokenCache"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # The view is sliced from the parent again by TokenCache.attach
+        return {**self.__dict__, "view": None}
+
+
+# Tokens that an edit's tail is never spliced back in at, see TokenTail.find
+UNSPLICEABLE = {
+    d_Grammar.QUOTE_DOUBLE,
+    d_Grammar.QUOTE_SINGLE,
+    d_Grammar.DIGIT,
+    d_Grammar.EOF,
+}
+
+
+class TokenTail:
+    """What was lexed after an edit, from before it was made. If lexing the
+    edited code ever starts a token where one of these started, everything
+    from there on would be lexed exactly the same, so it is spliced back in.
+    Keys of extras and literals are indexes into these tokens.
+    Nothing here is moved until it is spliced, so every pos is still delta
+    bytes short of where it really is in the edited code."""
+
+    def __init__(
+        self,
+        tokens: List[Token],
+        extras: Dict[int, Any],
+        literals: Dict[int, Tuple[int, Any, bool]],
+        pos: int,
+        eof: bool,
+        delta: int,
+    ) -> None:
+        self.tokens: List[Token] = tokens
+        self.extras: Dict[int, Any] = extras
+        self.literals: Dict[int, Tuple[int, Any, bool]] = literals
+        self.pos: int = pos  # Where lexing was after the last of the tokens
+        self.eof: bool = eof
+        self.delta: int = delta
+
+    def find(self, tok: Token) -> Optional[int]:
+        """The index of the token that tok lines up with, if any"""
+        pos = tok.loc.pos - self.delta
+        index = _find_token(self.tokens, pos)
+        while index < len(self.tokens) and self.tokens[index].loc.pos == pos:
+            grammar = self.tokens[index].grammar
+            # Whether a quote opens or closes a string depends on what came
+            # before it, and so does whether its string contents get read.
+            # A number read after a sign includes the sign.
+            # An EOF can be at the same pos as the last token.
+            if grammar not in UNSPLICEABLE:
+                return index if grammar == tok.grammar else None
+            index += 1
+        return None
+
+    def after(self, pos: int) -> int:
+        """The index of the first token at or after pos in the edited code"""
+        return _find_token(self.tokens, pos - self.delta)
+
+    def end(self) -> int:
+        """pos of the last token in the edited code"""
+        return self.tokens[-1].loc.pos + self.delta
+
+
+def _find_token(tokens: List[Token], pos: int) -> int:
+    """The index of the first token at or after pos"""
+    low, high = 0, len(tokens)
+    while low < high:
+        mid = (low + high) // 2
+        if tokens[mid].loc.pos < pos:
+            low = mid + 1
+        else:
+            high = mid
+    return low
+
+
+def _shift_tokens(tokens: List[Token], delta: int) -> None:
+    if delta:
+        for tok in tokens:
+            tok.loc.pos += delta
+
+
+def _shift_extra(extra: Any, delta: int) -> None:
+    if not delta:
+        return
+    if isinstance(extra, CodeLocation):
+        extra.pos += delta
+    elif isinstance(extra, BodySpan):
+        extra.start_loc.pos += delta
+        extra.end_loc.pos += delta
+        _shift_tokens(extra.tokens, delta)
+        extra.token_cache.lines.start += delta
+        extra.token_cache.braces.start += delta
+
+
+class TokenCache:
+    """The lexed form of a single body, built once and replayed every time
+    that body is interpreted again, such as every call of a function.
+
+    Tokens are lexed lazily, only as far as an interpreter has asked for them,
+    so that lexing errors are raised at exactly the same point as always.
+    Words are stored unresolved, since their meaning depends on the scope
+    at the time they are read. Anything the interpreter reads directly from
+    the code after a token (string contents, the rest of a number, a body)
+    is stored in extras, under the index of that token.
+
+    The lexer only tracks pos. Every location it makes shares the lines index,
+    which works out the line and col if they are ever needed."""
+
+    def __init__(
+        self, view: memoryview, lines: LineIndex, braces: Optional[BraceIndex] = None
+    ) -> None:
+        self.view: memoryview = view
+        self.code: bytes = view.tobytes()  # for the bulk scans in the lexer
+        self.lines: LineIndex = lines
+        self.braces: BraceIndex = braces or BraceIndex.from_code(self.code)
+        self.pos: int = 0
+        self.eof: bool = False
+        self.tokens: List[Token] = []
+        self.extras: Dict[int, Any] = {}
+        # Lists and JSON made only of literals, parsed once into plain data.
+        # Index of the opening token -> (index after the closing token, data,
+        # whether it contained JSON)
+        self.literals: Dict[int, Tuple[int, Any, bool]] = {}
+        # The inline cache of every dotted name, by the index of its word token.
+        # These hold classes from a run, so they are never saved to disk.
+        self.dots: Dict[int, List[Lookup]] = {}
+        # Where to rewind pos to, if the last lex raised an error
+        self.rewind: Optional[Tuple[int, bool]] = None
+        # What was lexed after the last edit, to pick up again if lexing lines up
+        self.tail: Optional[TokenTail] = None
+
+    @property
+    def loc(self) -> CodeLocation:
+        return CodeLocation(self.pos, lines=self.lines)
+
+    def lex(self, lex_func: Callable, *args) -> Any:
+        """Run a lexing function on the code, where the last token left off.
+        A failed lex is not cached, so it must be fully undone before the next."""
+        if self.rewind is not None:
+            self.pos, self.eof = self.rewind
+            self.rewind = None
+        saved = (self.pos, self.eof)
+        try:
+            return lex_func(self, *args)
+        except Exception:
+            self.rewind = saved
+            raise
+
+    def lex_token(self) -> None:
+        """Lex the next token onto the end of tokens. If it lines up with the
+        tail left by an edit, the rest of the tail comes along with it."""
+        tok = self.lex(lex_token)
+        self.tokens.append(tok)
+        if self.tail is not None:
+            self._splice_tail(tok)
+
+    def edit(self, code: bytes, offset: int, removed: int, added: int) -> None:
+        """Update this cache of the outermost code in place, after removed bytes
+        at offset were replaced by added bytes, giving code.
+        Anything lexed before the edit is kept, along with every body that
+        doesn't contain it. The body that does is edited the same way.
+        Anything lexed after the edit is kept in the tail, in case lexing the
+        edited code lines up with it again."""
+        self.lines.edit(code, offset, removed, added)
+        self.braces.edit(code, offset, removed, added)
+        self._edit(memoryview(code), offset, removed, added)
+
+    def _edit(self, view: memoryview, offset: int, removed: int, added: int) -> None:
+        delta = added - removed
+        self.view = view
+        self.code = view.tobytes()
+        if self.rewind is not None:
+            self.pos, self.eof = self.rewind
+            self.rewind = None
+
+        for index, extra in self.extras.items():
+            if not isinstance(extra, BodySpan):
+                continue
+            start, close = extra.start_loc.pos, extra.end_loc.pos
+            if start <= offset and offset + removed <= close:
+                brace = self.tokens[index].loc.pos
+                if self.braces.find_close(brace) != close + delta:
+                    break  # The edit changed which |} ends the body
+                _shift_tokens(self.tokens[index + 1 :], delta)
+                for key, later in self.extras.items():
+                    if key > index:
+                        _shift_extra(later, delta)
+                self.pos += delta
+                self._edit_tail(offset, removed, delta)
+
+                extra.end_loc.pos += delta
+                inside = self.braces.last_inside(start, close + delta, 2)
+                extra.tokens[-1].loc.pos += delta
+                extra.tokens[:-1] = [_brace_token(self, pos) for pos in inside]
+                extra.view = memoryview(view[start : close + delta])
+                extra.token_cache._edit(extra.view, offset - start, removed, added)
+                return
+        self._truncate(offset, removed, delta)
+
+    def _truncate(self, offset: int, removed: int, delta: int) -> None:
+        tokens = self.tokens
+        # The first token that might have been touched by the edit
+        first = _find_token(tokens, offset)
+        while first > 0 and tokens[first - 1].grammar == d_Grammar.EOF:
+            first -= 1
+        # The first token entirely after the edit
+        after = _find_token(tokens, offset + removed)
+
+        if after < len(tokens):
+            # Whatever tail an earlier edit left can't follow on from this one
+            self.tail = TokenTail(
+                tokens[after:],
+                {key - after: x for key, x in self.extras.items() if key >= after},
+                {
+                    start - after: (end - after, data, has_json)
+                    for start, (end, data, has_json) in self.literals.items()
+                    if start >= after
+                },
+                self.pos,
+                self.eof,
+                delta,
+            )
+        else:
+            self._edit_tail(offset, removed, delta)
+
+        # The token just before might run into the edit, so it is lexed again,
+        # unless it opened a body that ends before the edit.
+        keep = max(first - 1, 0)
+        self.pos = tokens[keep].loc.pos if first else 0
+        body = self.extras.get(keep)
+        if first and isinstance(body, BodySpan) and body.end_loc.pos + 2 <= offset:
+            keep += 1
+            self.pos = body.end_loc.pos + 2
+        self.eof = False
+        del tokens[keep:]
+        self.extras = {key: x for key, x in self.extras.items() if key < keep}
+        self.dots = {key: x for key, x in self.dots.items() if key < keep}
+        self.literals = {
+            start: literal
+            for start, literal in self.literals.items()
+            if literal[0] <= keep
+        }
+
+    def _edit_tail(self, offset: int, removed: int, delta: int) -> None:
+        """Keep only the part of the tail after the edit"""
+        if self.tail is None:
+            return
+        tail = self.tail
+        after = tail.after(offset + removed)
+        if after == len(tail.tokens):
+            self.tail = None
+            return
+        if after > 0:
+            self.tail = TokenTail(
+                tail.tokens[after:],
+                {key - after: x for key, x in tail.extras.items() if key >= after},
+                {
+                    start - after: (end - after, data, has_json)
+                    for start, (end, data, has_json) in tail.literals.items()
+                    if start >= after
+                },
+                tail.pos,
+                tail.eof,
+                tail.delta,
+            )
+        self.tail.delta += delta  # type: ignore
+
+    def _splice_tail(self, tok: Token) -> None:
+        tail: TokenTail = self.tail  # type: ignore
+        index = tail.find(tok)
+        if index is None:
+            if tok.loc.pos > tail.end():
+                self.tail = None  # Lexing went past it without ever lining up
+            return
+        shift = len(self.tokens) - 1 - index
+        self.tokens[-1:] = tail.tokens[index:]
+        _shift_tokens(tail.tokens[index:], tail.delta)
+        for key, extra in tail.extras.items():
+            if key >= index:
+                _shift_extra(extra, tail.delta)
+                self.extras[key + shift] = extra
+        for start, (end, data, has_json) in tail.literals.items():
+            if start >= index:
+                self.literals[start + shift] = (end + shift, data, has_json)
+        self.pos, self.eof = tail.pos + tail.delta, tail.eof
+        self.tail = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = {**self.__dict__, "view": None, "code": None, "tail": None}
+        state["dots"] = None
+        if self.rewind is not None:
+            state["pos"], state["eof"] = self.rewind
+            state["rewind"] = None
+        # Plain lists pickle far faster than a Token and CodeLocation each
+        state["tokens"] = (
+            [GRAMMAR_CODES[tok.grammar] for tok in self.tokens],
+            [tok.loc.pos for tok in self.tokens],
+            [tok.word for tok in self.tokens],
+        )
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        grammars, positions, words = state["tokens"]
+        lines = state["lines"]
+        state["tokens"] = [
+            Token(GRAMMARS[grammar], CodeLocation(pos, lines=lines), word)
+            for grammar, pos, word in zip(grammars, positions, words)
+        ]
+        state["dots"] = {}
+        self.__dict__.update(state)
+
+    def attach(self, view: memoryview) -> None:
+        """Give a cache loaded from disk the code it was lexed from,
+        along with the bodies inside it."""
+        self.view = view
+        self.code = view.tobytes()
+        for extra in self.extras.values():
+            if isinstance(extra, BodySpan):
+                extra.view = memoryview(view[extra.start_loc.pos : extra.end_loc.pos])
+                extra.token_cache.attach(extra.view)
+
+    def progress(self) -> int:
+        """How much has been lexed in this body and every body inside it"""
+        count = len(self.tokens) + len(self.extras) + len(self.literals)
+        for extra in self.extras.values():
+            if isinstance(extra, BodySpan):
+                count += extra.token_cache.progress()
+        return count
+
+    def get_line(self, loc: CodeLocation) -> str:
+        """The full line of code that loc is on, for error messages"""
+        beg = loc.pos - loc.col + 1
+        end = self.code.find(b"\n", loc.pos + 1)
+        if end == -1:
+            end = len(self.code)
+        return self.code[beg:end].decode()
+
+
+def get_token_cache(body: d_Body) -> TokenCache:
+    """Get the TokenCache for a body, making a new one if its view has changed.
+    Dits reuse the cache of the same file, from earlier in this run or on disk."""
+    cache: Optional[TokenCache] = body.token_cache
+    if cache is None or cache.view is not body.view:
+        code = body.view.tobytes()
+        if isinstance(body, d_Dit):
+            cache = _get_dit_cache(body, code)
+            if cache is not None:
+                body.view = cache.view
+                body.token_cache = cache
+                return cache
         # We need to start from 0 pos, but maintain the line and column
         # from the parent body.
-        new_loc = CodeLocation(0, body.start_loc.col, body.start_loc.line)
-        self.char_feed = CharFeed(body.view, new_loc)
-        self.eof: bool = False
+        lines = LineIndex.from_code(code, body.start_loc.col, body.start_loc.line)
+        cache = TokenCache(body.view, lines)
+        body.token_cache = cache
+        if isinstance(body, d_Dit):
+            DIT_CACHES[body.path] = (code, cache, 0)
+    return cache
+
+
+# The TokenCache of every dit file run so far, by path, along with its code.
+# Also the progress of each cache when it was last saved, to only save changed ones.
+DIT_CACHES: Dict[str, Tuple[bytes, TokenCache, int]] = {}
+
+
+def _get_dit_cache(dit: d_Dit, code: bytes) -> Optional[TokenCache]:
+    if dit.path in DIT_CACHES:
+        prev_code, cache, _ = DIT_CACHES[dit.path]
+        return cache if prev_code == code else None
+    cache = disk_cache.load(dit.path, code)
+    if not isinstance(cache, TokenCache):
+        return None
+    cache.attach(dit.view)
+    DIT_CACHES[dit.path] = (code, cache, cache.progress())
+    return cache
+
+
+def save_dit_caches() -> None:
+    """Save every dit cache that lexed anything new during this run"""
+    for path, (code, cache, progress) in DIT_CACHES.items():
+        now = cache.progress()
+        if now != progress:
+            disk_cache.save(path, code, cache)
+            DIT_CACHES[path] = (code, cache, now)
+
+
+def edit_dit(path: str, offset: int, removed: int, inserted: str) -> str:
+    """Apply an edit to the dit last run from path, replacing removed bytes
+    at offset with inserted. Returns the edited code, which can then be run
+    again with only the bodies touched by the edit being lexed again."""
+    if path not in DIT_CACHES:
+        raise ValueError(f"No dit has been run from '{path}'")
+    code, cache, _ = DIT_CACHES[path]
+    if offset < 0 or removed < 0 or offset + removed > len(code):
+        raise ValueError(f"Edit is outside of the {len(code)} bytes of '{path}'")
+    added = inserted.encode()
+    code = code[:offset] + added + code[offset + removed :]
+    cache.edit(code, offset, removed, len(added))
+    # Always different from the real progress, so that the edit gets saved
+    DIT_CACHES[path] = (code, cache, -1)
+    return code.decode()
+
+
+class InterpretContext:
+    def __init__(self, body: d_Body) -> None:
+        self.token_cache: TokenCache = get_token_cache(body)
+        self.index: int = 0  # Index of the next token in the token_cache
+        # Only bodies that run more than once are worth saving literals for
+        self.replaying: bool = bool(self.token_cache.tokens)
         self.body: d_Body = body
 
         self.prev_tok: Token = None  # type: ignore
@@ -99,161 +660,376 @@ class InterpretContext:
         self.next_tok = tok
 
     def get_token(self, find_word: bool = True) -> Token:
-        if self.eof:
-            return _handle_eof(self)
+        cache = self.token_cache
+        if self.index < len(cache.tokens):
+            tok = cache.tokens[self.index]
+        else:
+            cache.lex_token()
+            tok = cache.tokens[self.index]
+        self.index += 1
+        if tok.grammar == d_Grammar.WORD:
+            return _resolve_word(self, tok, find_word)
+        return tok
+
+    def read_str(self) -> str:
+        """Read the contents of the string opened by next_tok"""
+        return self._get_extra(lex_str, self.next_tok)
 
-        res = _clear_whitespace_and_comments(self)
-        if res:
-            return res
+    def read_num(self, neg: bool) -> str:
+        """Read the entire number started by the DIGIT in next_tok"""
+        return self._get_extra(lex_num, self.next_tok, neg)
+
+    def read_sign(self) -> Optional[CodeLocation]:
+        """Check that a digit directly follows the +/- sign in next_tok.
+        Returns the location the digit was expected at if it does not."""
+        return self._get_extra(lex_sign)
+
+    def read_body(self) -> BodySpan:
+        """Skip the body opened by the {| in next_tok, up to the matching |}.
+        The last bar braces in the body become the current tokens."""
+        span: BodySpan = self._get_extra(lex_body, self.next_tok)
+        for tok in span.tokens:
+            self._manipulate_tokens(tok)
+        return span
+
+    def skip_literal(self) -> Any:
+        """If the list or JSON opened by next_tok was saved by save_literal,
+        jump straight past it and return its data. Otherwise returns None."""
+        literal = self.token_cache.literals.get(self.index - 1)
+        if literal is None:
+            return None
+        end, data, has_json = literal
+        tokens = self.token_cache.tokens
+        # Leave everything exactly as reading the whole literal would have
+        self.curr_tok = tokens[end - 2]
+        self.next_tok = tokens[end - 1]
+        self.index = end
+        self.advance_tokens()
+        if has_json:
+            self.in_json = False
+        return data
+
+    def save_literal(self, start: int, value: d_Thing) -> None:
+        """Save the list or JSON just read, which started at token index start,
+        if it was made only of literals. Every later replay can skip it."""
+        if not self.replaying:
+            return
+        tokens = self.token_cache.tokens[start : self.index - 2]
+        grammars = {tok.grammar for tok in tokens}
+        if grammars.issubset(LITERALS):
+            has_json = d_Grammar.BRACE_LEFT in grammars
+            if isinstance(value, d_List) and isinstance(value.items, PackedValues):
+                data = value.items
+            else:
+                data = value.get_data()
+            self.token_cache.literals[start] = (self.index - 1, data, has_json)
+
+    def dot_site(self) -> List[Lookup]:
+        """The inline cache of the name being dotted, in next_tok"""
+        dots = self.token_cache.dots
+        site = dots.get(self.index - 1)
+        if site is None:
+            site = dots[self.index - 1] = []
+        return site
+
+    def _get_extra(self, lex_func: Callable, *args) -> Any:
+        key = self.index - 1
+        cache = self.token_cache
+        if key in cache.extras:
+            return cache.extras[key]
+        elif key != len(cache.tokens) - 1:
+            raise d_CriticalError("Token cache lost its place in the code")
+        value = cache.lex(lex_func, *args)
+        cache.extras[key] = value
+        return value
+
+
+def _resolve_word(inter: InterpretContext, tok: Token, find_word: bool) -> Token:
+    word = tok.word
+    built_in = BUILT_INS.lookup.get(word)
+    if built_in is not None:
+        return Token(d_Grammar.VALUE_FUNC, tok.loc, thing=built_in)
+    # Used by var.class.attr expressions
+    # They find the word themselves.
+    if find_word is False:
+        return Token(d_Grammar.WORD, tok.loc, word=word)
+    # Most names
+    attr = inter.body.find_attr(word, scope_mode=True)
+    if attr:
+        return Token(attr.grammar, tok.loc, thing=attr)
+    else:
+        return Token(d_Grammar.NEW_NAME, tok.loc, word=word)
 
-        res = _find_double_chars(self)
-        if res:
-            return res
 
-        res = _find_single_chars(self)
-        if res:
-            return res
+# lex_token, lex_str, lex_num, lex_sign and lex_body are the lexing functions
+# passed to TokenCache.lex, by the interpreter and by the checker alike
+def lex_token(cache: TokenCache) -> Token:
+    if cache.eof:
+        return _handle_eof(cache)
 
-        res = _find_digit(self)
-        if res:
-            return res
+    res = _clear_whitespace_and_comments(cache)
+    if res:
+        return res
 
-        res = _find_words(self, find_word)
-        if res:
-            return res
+    res = _find_double_chars(cache)
+    if res:
+        return res
 
-        raise d_SyntaxError(f"Unrecognized token '{self.char_feed.current()}'")
+    res = _find_single_chars(cache)
+    if res:
+        return res
 
+    res = _find_digit(cache)
+    if res:
+        return res
 
-WHITESPACE = re.compile(r"\s")
+    res = _find_words(cache)
+    if res:
+        return res
 
+    raise d_SyntaxError(f"Unrecognized token '{chr(cache.code[cache.pos])}'")
 
-def _clear_whitespace_and_comments(inter: InterpretContext) -> Optional[Token]:
+
+# Every byte that re's \s matches as a single character
+WHITESPACE = re.compile(rb"[\t\n\x0b\x0c\r\x1c-\x1f \x85\xa0]+")
+LETTERS = re.compile(rb"[A-Za-z0-9_-]+")
+NUM_TAIL = re.compile(rb"[0-9.eE+-]+")
+SLASH = ord(d_Grammar.COMMENT_START.value)
+STAR = ord("*")
+NEWLINE = ord("\n")
+
+
+def _clear_whitespace_and_comments(cache: TokenCache) -> Optional[Token]:
+    code = cache.code
+    last = len(code) - 1
     while True:
-        if WHITESPACE.match(inter.char_feed.current()):
-            if inter.char_feed.eof():
-                return _handle_eof(inter)
-            else:
-                inter.char_feed.pop()
-        elif inter.char_feed.current() == d_Grammar.COMMENT_START.value:
-            _comment(inter.char_feed)
-            if inter.char_feed.eof():
-                return _handle_eof(inter)
+        ws = WHITESPACE.match(code, cache.pos)
+        if ws:
+            if ws.end() > last:
+                cache.pos = last
+                return _handle_eof(cache)
+            cache.pos = ws.end()
+        elif code[cache.pos] == SLASH:
+            _comment(cache)
+            if cache.pos == last:
+                return _handle_eof(cache)
         else:
             return None
 
 
-def _find_double_chars(inter: InterpretContext) -> Optional[Token]:
-    if inter.char_feed.eof():  # Can't be double if we only have 1 char
+def _comment(cache: TokenCache) -> None:
+    """Skip the comment starting at pos. A lone '/' is dropped."""
+    code = cache.code
+    last = len(code) - 1
+    if cache.pos == last:
+        raise d_EndOfFileError
+    cache.pos += 1
+    if code[cache.pos] == STAR:
+        # The search starts on the * of /*, so /*/ is a complete comment
+        close = code.find(d_Grammar.COMMENT_MULTI_CLOSE.value.encode(), cache.pos)
+        if close == -1:
+            cache.pos = last
+            raise d_EndOfFileError
+        # it's fine if */ is the last in the file
+        cache.pos = close + 2 if close + 1 < last else close + 1
+    elif code[cache.pos] == SLASH:
+        newline = code.find(d_Grammar.COMMENT_SINGLE_CLOSE.value.encode(), cache.pos)
+        cache.pos = last if newline == -1 else newline
+
+
+def _find_double_chars(cache: TokenCache) -> Optional[Token]:
+    pos = cache.pos
+    if pos + 1 >= len(cache.code):  # Can't be double if we only have 1 char
         return None
 
-    cur = inter.char_feed.current() + inter.char_feed.peek()
-    lok = copy.deepcopy(inter.char_feed.loc)
-    for d_Grammar in DOUBLES:
-        if cur == d_Grammar.value:
-            inter.char_feed.pop()  # pop first char in double
-            if inter.char_feed.eof():
-                inter.eof = True
-            else:
-                inter.char_feed.pop()  # pop the second if it's safe
-            return Token(d_Grammar, lok)
-
-
-def _find_single_chars(inter: InterpretContext) -> Optional[Token]:
-    cur = inter.char_feed.current()
-    lok = copy.deepcopy(inter.char_feed.loc)
-    for d_Grammar in SINGLES:
-        if cur == d_Grammar.value:
-            # WET, appears in _find_double_chars
-            if inter.char_feed.eof():
-                inter.eof = True
-            else:
-                inter.char_feed.pop()
-            return Token(d_Grammar, lok)
+    grammar = DOUBLE_LOOKUP.get(cache.code[pos : pos + 2].decode("latin-1"))
+    if grammar:
+        if pos + 2 >= len(cache.code):
+            cache.pos = pos + 1
+            cache.eof = True
+        else:
+            cache.pos = pos + 2
+        return Token(grammar, CodeLocation(pos, lines=cache.lines))
     return None
 
 
-DIGIT = re.compile(r"[0-9]")
+def _find_single_chars(cache: TokenCache) -> Optional[Token]:
+    pos = cache.pos
+    grammar = SINGLE_LOOKUP.get(chr(cache.code[pos]))
+    if grammar:
+        # WET, appears in _find_double_chars
+        if pos + 1 >= len(cache.code):
+            cache.eof = True
+        else:
+            cache.pos = pos + 1
+        return Token(grammar, CodeLocation(pos, lines=cache.lines))
+    return None
 
 
-def _find_digit(inter: InterpretContext) -> Optional[Token]:
-    lok = copy.deepcopy(inter.char_feed.loc)
-    cur = inter.char_feed.current()
-    if DIGIT.match(cur):
-        inter.char_feed.pop()
-        # we only get the first digit, interpreter handles the number
-        return Token(d_Grammar.DIGIT, lok, cur)
+def _is_digit(byte: int) -> bool:
+    return 48 <= byte <= 57  # 0-9
 
 
-LETTER = re.compile(r"[A-Za-z0-9_-]")
+def _find_digit(cache: TokenCache) -> Optional[Token]:
+    pos = cache.pos
+    if _is_digit(cache.code[pos]):
+        if pos + 1 >= len(cache.code):
+            raise d_EndOfFileError
+        cache.pos = pos + 1
+        # we only get the first digit, lex_num gets the rest of the number
+        loc = CodeLocation(pos, lines=cache.lines)
+        return Token(d_Grammar.DIGIT, loc, chr(cache.code[pos]))
 
 
-def _find_words(inter: InterpretContext, find_word: bool) -> Optional[Token]:
-    token_loc = copy.deepcopy(inter.char_feed.loc)
-    word = _get_word(inter)
+def _find_words(cache: TokenCache) -> Optional[Token]:
+    token_loc = CodeLocation(cache.pos, lines=cache.lines)
+    word = _get_word(cache)
     if word:
         # Keywords first
-        for grammar in KEYWORDS:
-            if word == grammar.value:
-                return Token(grammar, token_loc)
-        for built_in in BUILT_INS:
-            if word == built_in.name:
-                return Token(d_Grammar.VALUE_FUNC, token_loc, thing=built_in)
-        # Used by var.class.attr expressions
-        # They find the word themselves.
-        if find_word is False:
-            return Token(d_Grammar.WORD, token_loc, word=word)
-        # Most names
-        attr = inter.body.find_attr(word, scope_mode=True)
-        if attr:
-            return Token(attr.grammar, token_loc, thing=attr)
-        else:
-            return Token(d_Grammar.NEW_NAME, token_loc, word=word)
+        grammar = KEYWORD_LOOKUP.get(word)
+        if grammar:
+            return Token(grammar, token_loc)
+        # Everything else is resolved by _resolve_word, every time it's read
+        return Token(d_Grammar.WORD, token_loc, word=word)
     else:
         return None
 
 
-def _get_word(inter: InterpretContext) -> Optional[str]:
-    word = ""
-    while LETTER.match(inter.char_feed.current()):
-        word += inter.char_feed.current()
-        if inter.char_feed.eof():
-            inter.eof = True
-            break
-        else:
-            inter.char_feed.pop()
-    return word
+def _get_word(cache: TokenCache) -> Optional[str]:
+    match = LETTERS.match(cache.code, cache.pos)
+    if not match:
+        return None
+    end = match.end()
+    if end == len(cache.code):
+        cache.pos = end - 1
+        cache.eof = True
+    else:
+        cache.pos = end
+    return match.group().decode()
 
 
-def _handle_eof(inter: InterpretContext) -> Token:
-    inter.eof = True
-    return Token(d_Grammar.EOF, copy.deepcopy(inter.char_feed.loc))
+def _handle_eof(cache: TokenCache) -> Token:
+    cache.eof = True
+    return Token(d_Grammar.EOF, cache.loc)
 
 
-def _comment(feed: CharFeed) -> None:
-    com = feed.current() + feed.pop()
-    if com == d_Grammar.COMMENT_MULTI_OPEN.value:
-        _comment_multi(feed)
-    elif com == d_Grammar.COMMENT_SINGLE_OPEN.value:
-        _comment_single(feed)
+def lex_str(cache: TokenCache, quote: Token) -> str:
+    # note that strings are reused for JSON element names
+    code = cache.code
+    left = ord(quote.grammar.value)
+    pos = cache.pos
+    if code[pos] == left:
+        return ""
+    run = STRING_RUNS[left].match(code, pos)
+    if run.end() < len(code) and code[run.end()] == left:
+        # No escapes, so the value comes straight from the view
+        cache.pos = run.end()
+        return str(cache.view[pos : run.end()], "latin-1")
+    return _lex_escaped_str(cache, quote)
 
 
-def _comment_multi(feed: CharFeed) -> None:
+def _lex_escaped_str(cache: TokenCache, quote: Token) -> str:
+    code = cache.code
+    left = ord(quote.grammar.value)
+    parts: List[str] = []
+    length = 0
     while True:
-        # com = feed.current() + feed.peek()
-        if feed.current() + feed.peek() == d_Grammar.COMMENT_MULTI_CLOSE.value:
-            feed.pop()  # pop *
-            if not feed.eof():  # it's fine if */ is the last in the file
-                feed.pop()  # pop /
-            return
-        feed.pop()
+        run = STRING_RUNS[left].match(code, cache.pos)
+        if run.end() == len(code):
+            cache.pos = len(code) - 1
+            raise d_EndOfFileError
+        parts.append(str(cache.view[cache.pos : run.end()], "latin-1"))
+        length += run.end() - cache.pos
+        cache.pos = run.end()
+        cur = code[cache.pos]
+        if cur == left:
+            return "".join(parts)
+        elif cur == NEWLINE:
+            lok = CodeLocation(
+                quote.loc.pos + length, quote.loc.col + length, quote.loc.line
+            )
+            raise d_SyntaxError("Unexpected EOL while reading string", lok)
+        # Str test = "some\t"
+        # Str test = 'Let\'s'
+        _step(cache)
+        escape_char = ESCAPES.get(chr(code[cache.pos]), "")
+        _step(cache)
+        parts.append(escape_char)
+        length += len(escape_char)
 
 
-def _comment_single(feed: CharFeed) -> None:
-    if feed.eof():
-        return
-    while feed.current() != d_Grammar.COMMENT_SINGLE_CLOSE.value:
-        if feed.eof():
-            return
-        else:
-            feed.pop()
+# Everything up to the next closing quote, backslash, or newline
+STRING_RUNS = {
+    ord(quote): re.compile(rb"[^%s\\\n]*" % quote) for quote in [b"'", b'"']
+}
+ESCAPES = {
+    d_Grammar.QUOTE_DOUBLE.value: d_Grammar.QUOTE_DOUBLE.value,
+    d_Grammar.QUOTE_SINGLE.value: d_Grammar.QUOTE_SINGLE.value,
+    d_Grammar.BACKSLASH.value: d_Grammar.BACKSLASH.value,
+    d_Grammar.ESCAPE_NEWLINE.value: "\n",
+    d_Grammar.ESCAPE_TAB.value: "\t",
+}
+
+
+def _step(cache: TokenCache) -> None:
+    if cache.pos + 1 >= len(cache.code):
+        raise d_EndOfFileError
+    cache.pos += 1
+
+
+def lex_num(cache: TokenCache, first: Token, neg: bool) -> str:
+    num = first.word
+    num = "-" + num if neg else num
+    if num == "0" and _is_digit(cache.code[cache.pos]):
+        raise d_SyntaxError("Leading zeros are not allowed")
+    tail = NUM_TAIL.match(cache.code, cache.pos)
+    if not tail:
+        return num
+    if tail.end() == len(cache.code):
+        cache.pos = tail.end() - 1
+        raise d_EndOfFileError
+    cache.pos = tail.end()
+    return num + tail.group().decode()
+
+
+def lex_sign(cache: TokenCache) -> Optional[CodeLocation]:
+    # make sure the sign is being used as a positive or negative,
+    # not for arithmetic
+    if _is_digit(cache.code[cache.pos]):
+        return None
+    return cache.loc
+
+
+def lex_body(cache: TokenCache, brace_left: Token) -> BodySpan:
+    if cache.eof:
+        raise d_EndOfFileError
+    start = cache.pos
+    close = cache.braces.find_close(brace_left.loc.pos)
+    if close is None:
+        raise d_CriticalError("A bar brace was missing from the brace index")
+    elif close == -1:
+        inside = cache.braces.last_inside(brace_left.loc.pos, len(cache.code), 1)
+        cache.pos = len(cache.code) - 1
+        # The interpreter would have had the last bar brace as next_tok
+        loc = _brace_token(cache, inside[-1]).loc if inside else None
+        raise d_EndOfFileError(loc)
+
+    # Only the last few bar braces can still be prev_tok, curr_tok or next_tok
+    inside = cache.braces.last_inside(start, close, 2)
+    tokens = [_brace_token(cache, pos) for pos in inside]
+    cache.pos = close
+    tokens.append(lex_token(cache))
+
+    start_loc = CodeLocation(start, lines=cache.lines)
+    end_loc = CodeLocation(close, lines=cache.lines)
+    view = memoryview(cache.view[start:close])
+    child = TokenCache(view, cache.lines.nested(start), cache.braces.nested(start))
+    return BodySpan(start_loc, end_loc, tokens, view, child)
+
+
+def _brace_token(cache: TokenCache, pos: int) -> Token:
+    if cache.code[pos] == BRACE:
+        grammar = d_Grammar.BAR_BRACE_LEFT
+    else:
+        grammar = d_Grammar.BAR_BRACE_RIGHT
+    return Token(grammar, CodeLocation(pos, lines=cache.lines))
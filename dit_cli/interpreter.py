@@ -1,6 +1,4 @@
-import copy
-from itertools import zip_longest
-from typing import List, NoReturn, Optional, Tuple, Union
+from typing import Any, List, NoReturn, Optional, Tuple, Union
 
 from dit_cli.built_in import b_Ditlang
 from dit_cli.exceptions import (
@@ -26,17 +24,17 @@ from dit_cli.grammar import (
     d_Grammar,
     prim_to_value,
 )
-from dit_cli.interpret_context import DIGIT, InterpretContext
+from dit_cli.interpret_context import InterpretContext
 from dit_cli.lang_daemon import run_job
 from dit_cli.oop import (
     ArgumentLocation,
     Declarable,
     GuestDaemonJob,
     JobType,
+    PackedValues,
     Ref_Thing,
     ReturnController,
     Token,
-    check_value,
     d_Body,
     d_Bool,
     d_Class,
@@ -51,7 +49,7 @@ from dit_cli.oop import (
     d_Str,
     d_Thing,
     d_Type,
-    d_Variable,
+    scope_key,
 )
 from dit_cli.preprocessor import preprocess
 from dit_cli.settings import CodeLocation
@@ -65,17 +63,14 @@ def interpret(body: d_Body) -> Optional[d_Thing]:
     Used recursively. Classes, functions, and imported dits are all interpreted
     recursively as new bodies with new InterpretContexts.
     Classes and dits are only interpreted once. Functions are re-interpreted
-    every time they are called."""
+    every time they are called, replaying the tokens cached on the body."""
 
     if not body.is_ready():
         return
     inter = InterpretContext(body)
     last_ret: Optional[d_Thing] = None
     try:
-        at_eof = False
-        while not at_eof:
-            if inter.char_feed.eof():
-                at_eof = True  # one extra iteration for the last char
+        while True:
             inter.advance_tokens()
             if inter.next_tok.grammar == d_Grammar.EOF:
                 return last_ret  # Only at EOF whitespace or comment
@@ -94,15 +89,15 @@ def _generate_origin(
 ) -> None:
     if not err.loc:
         # If the code is total garbage, the next token may not be assigned.
-        # In that case, we default to wherever the char_feed happens to be.
+        # In that case, we default to wherever the lexer happens to be.
         if inter.next_tok:
             err.loc = inter.next_tok.loc
         else:
-            err.loc = inter.char_feed.loc
+            err.loc = inter.token_cache.loc
 
     if inter.body.path is None:
         raise d_CriticalError("A body had no path during exception")
-    code = inter.char_feed.get_line(err.loc)
+    code = inter.token_cache.get_line(err.loc)
     err.set_origin(inter.body.path, code)
 
 
@@ -286,10 +281,11 @@ def _dot(inter: InterpretContext) -> Token:
         # We need to prepare in case the instance has inherited parents
         target.clear_prefix_to_func()
         inter.dotted_inst = target
+        result = target.find_attr(inter.next_tok.word, site=inter.dot_site())
     elif not isinstance(target, d_Container):
         raise d_CriticalError(f"Expected container, got {target.public_type}")
-
-    result = target.find_attr(inter.next_tok.word)
+    else:
+        result = target.find_attr(inter.next_tok.word)
     if not result and inter.dotted_inst:
         # this.B.attribute
         # We are doing explicit name disambiguation, looking in parent B instead of A.
@@ -304,7 +300,7 @@ def _dot(inter: InterpretContext) -> Token:
             # if `func` is an inherited function, we need to remember that we
             # called it so the prefixes are set up correctly.
             inter.dotted_inst.add_func_sep()
-        return Token(result.grammar, copy.deepcopy(inter.next_tok.loc), thing=result)
+        return Token(result.grammar, inter.next_tok.loc, thing=result)
     else:
         # The name was not found in the dotted body, so its a new name.
         # This means we are declaring a new var in the dotted body.
@@ -330,7 +326,7 @@ def _equalable(inter: InterpretContext) -> Optional[d_Thing]:
     elif inter.next_tok.grammar == d_Grammar.EQUALS:
         # Assign existing or new variables
         # Str value = ...
-        equal_loc = copy.deepcopy(inter.next_tok.loc)
+        equal_loc = inter.next_tok.loc
         _equals(inter, equal_loc)
         inter.dec.reset()
     elif inter.dec.type_ and not inter.equaling:
@@ -343,7 +339,7 @@ def _equalable(inter: InterpretContext) -> Optional[d_Thing]:
 
 
 def _equals(inter: InterpretContext, equal_loc: CodeLocation) -> None:
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     if inter.anon_tok or inter.call_tok:
         # prevent assignment to anonymous tokens.
         raise NotImplementedError
@@ -425,7 +421,7 @@ def _terminal(inter: InterpretContext) -> d_Thing:
         inter.call_tok = None
         return ret
     else:
-        inter.terminal_loc = copy.deepcopy(inter.curr_tok.loc)
+        inter.terminal_loc = inter.curr_tok.loc
         # This return is how _equals gets it's value.
         return inter.curr_tok.thing
 
@@ -451,7 +447,7 @@ def _new_name(inter: InterpretContext) -> None:
             )
         # if there is an equals, then we just pretend the declaration was 'Thing'
         inter.dec.type_ = d_Grammar.PRIMITIVE_THING
-        equal_loc = copy.deepcopy(inter.next_tok.loc)
+        equal_loc = inter.next_tok.loc
         _equals(inter, equal_loc)
         inter.dec.reset()
         _terminal(inter)
@@ -459,38 +455,7 @@ def _new_name(inter: InterpretContext) -> None:
 
 def _str(inter: InterpretContext) -> d_Str:
     # note that _str is reused for parsing JSON element names
-    left = inter.next_tok.grammar.value
-    data = ""
-    if inter.char_feed.current() != left:
-        while True:
-            if inter.char_feed.current() == "\n":
-                lok = copy.deepcopy(inter.next_tok.loc)
-                length = len(data)
-                lok.pos += length
-                lok.col += length
-                raise d_SyntaxError("Unexpected EOL while reading string", lok)
-            elif inter.char_feed.current() == d_Grammar.BACKSLASH.value:
-                # Str test = "some\t"
-                # Str test = 'Let\'s'
-                escape_char = inter.char_feed.pop()
-                inter.char_feed.pop()
-                if escape_char in [
-                    d_Grammar.QUOTE_DOUBLE.value,
-                    d_Grammar.QUOTE_SINGLE.value,
-                    d_Grammar.BACKSLASH.value,
-                ]:
-                    data += escape_char
-                elif escape_char == d_Grammar.ESCAPE_NEWLINE.value:
-                    data += "\n"
-                elif escape_char == d_Grammar.ESCAPE_TAB.value:
-                    data += "\t"
-            else:
-                data += inter.char_feed.current()
-                inter.char_feed.pop()
-
-            if inter.char_feed.current() == left:
-                break
-
+    data = inter.read_str()
     inter.advance_tokens()  # next_tok is now ' "
     inter.advance_tokens()  # next_tok is now ; , ] ) :
     thing = d_Str()
@@ -520,51 +485,19 @@ def _minus(inter: InterpretContext) -> d_Num:
 def _digit_sign(inter: InterpretContext, neg: bool) -> d_Num:
     # make sure the sign is being used as a positive or negative,
     # not for arithmetic
-    if DIGIT.match(inter.char_feed.current()):
+    missing_loc = inter.read_sign()
+    if missing_loc is None:
         inter.advance_tokens()
         return _digit(inter, neg)
     else:
         raise d_SyntaxError(
             "Expected digit.\nOther arithmetic ops are not yet supported.",
-            inter.char_feed.loc,  # Default uses inter.next_tok.lok
+            missing_loc,  # Default uses inter.next_tok.lok
         )
 
 
 def _digit(inter: InterpretContext, neg: bool = False) -> d_Num:
-    num = inter.next_tok.word
-    num = "-" + num if neg else num
-    lead_zero = num == "0"
-    frac = False
-    exp = False
-    while True:
-        cur = inter.char_feed.current()
-        if DIGIT.match(cur):
-            # 3
-            if lead_zero and len(num) == 1:
-                raise d_SyntaxError("Leading zeros are not allowed")
-            num += cur
-            inter.char_feed.pop()
-            lead_zero = False
-        elif cur == ".":
-            # 3.
-            if frac == True:
-                raise d_SyntaxError("Invalid fraction syntax")
-            num += cur
-            inter.char_feed.pop()
-            frac == True
-        elif cur == "e" or cur == "E":
-            # 3e ... 10
-            if exp == True:
-                raise d_SyntaxError("Invalid exponent syntax")
-            num += cur
-            inter.char_feed.pop()
-            exp == True
-        elif cur == "-" or cur == "+":
-            # -3
-            num += cur
-            inter.char_feed.pop()
-        else:
-            break
+    num = inter.read_num(neg)
     return _finalize_num(inter, num)
 
 
@@ -582,14 +515,54 @@ def _finalize_num(inter: InterpretContext, num: str) -> d_Num:
 
 
 def _bracket_left(inter: InterpretContext) -> d_List:
+    literal = inter.skip_literal()
+    if literal is not None:
+        return _from_literal(literal)  # type: ignore
+    start = inter.index - 1
     list_ = d_List()
     list_.list_ = [item.thing for item in _arg_list(inter, d_Grammar.BRACKET_RIGHT)]
     list_.is_null = False
+    inter.save_literal(start, list_)
     return list_
 
 
+def _from_literal(data: Any) -> d_Thing:
+    """Make fresh things from the data of a literal saved by save_literal"""
+    if data is None:
+        return d_Thing.get_null_thing()
+    elif isinstance(data, bool):
+        thing = d_Bool()
+        thing.bool_ = data
+    elif isinstance(data, (int, float)):
+        thing = d_Num()
+        thing.num = data
+    elif isinstance(data, str):
+        thing = d_Str()
+        thing.str_ = data
+    elif isinstance(data, PackedValues):
+        # Packed values are never changed, so every replay can share them
+        thing = d_List()
+        thing.items = data
+    elif isinstance(data, list):
+        thing = d_List()
+        packed = PackedValues.from_data(data)
+        if packed is not None:
+            thing.items = packed
+        else:
+            thing.items = [_from_literal(item) for item in data]
+    else:
+        thing = d_JSON()
+        thing.json_ = {name: _from_literal(item) for name, item in data.items()}
+    thing.is_null = False
+    return thing
+
+
 def _brace_left(inter: InterpretContext) -> d_JSON:
     # JSON j = { ...
+    literal = inter.skip_literal()
+    if literal is not None:
+        return _from_literal(literal)  # type: ignore
+    start = inter.index - 1
     inter.in_json = True
     js = d_JSON()
     js.is_null = False
@@ -601,6 +574,7 @@ def _brace_left(inter: InterpretContext) -> d_JSON:
             # JSON j = { ... }
             inter.in_json = False
             inter.advance_tokens()
+            inter.save_literal(start, js)
             return js
         elif inter.next_tok.grammar == d_Grammar.QUOTE_DOUBLE:
             # JSON j = { "item1": ...
@@ -703,7 +677,7 @@ def _make(inter: InterpretContext) -> d_Func:
 
 
 def _return(inter: InterpretContext) -> NoReturn:
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     if not isinstance(inter.body, d_Func):
         raise d_SyntaxError("'return' outside of function")
     inter.advance_tokens()
@@ -715,34 +689,17 @@ def _return(inter: InterpretContext) -> NoReturn:
     except d_TypeMismatchError as err:
         err.loc = orig_loc
         raise
-        # mis.set_origin(inter.body.path, orig_loc, inter.char_feed.get_line(orig_loc))
+        # mis.set_origin(inter.body.path, orig_loc, inter.token_cache.get_line(orig_loc))
         # raise mis
 
 
 def _get_func_args(inter: InterpretContext, func: d_Func) -> None:
-    func.call_loc = copy.deepcopy(inter.curr_tok.loc)
-    arg_locs = _arg_list(inter, d_Grammar.PAREN_RIGHT)
-    miss = abs(len(func.parameters) - len(arg_locs))
-    name = func.pub_name()
-
-    for param, arg_loc in zip_longest(func.parameters, arg_locs):
-        param: Declarable
-        arg_loc: ArgumentLocation
-        if not arg_loc:
-            raise d_SyntaxError(f"{name} missing {miss} required arguments")
-        elif not param:
-            # TODO: implement proper k-args functionality
-            raise d_SyntaxError(f"{name} given {miss} too many arguments")
-        else:
-            res = check_value(arg_loc.thing, param)
-            if res:
-                o = f"{name} expected '{res.expected}', got '{res.actual}'{res.extra}"
-                raise d_TypeMismatchError(o, arg_loc.loc)
-
-        func.add_attr(param, arg_loc.thing, use_ref=True)
+    func.call_loc = inter.curr_tok.loc
+    func.bind_args(_arg_list(inter, d_Grammar.PAREN_RIGHT))
 
 
 def _run_func(inter: InterpretContext, func: d_Func) -> Token:
+    job: Optional[GuestDaemonJob] = None
     try:
         if func.is_built_in:
             if func.name == "getConfig":
@@ -754,20 +711,22 @@ def _run_func(inter: InterpretContext, func: d_Func) -> Token:
         else:
             if not func.code:
                 raise ReturnController(d_Thing.get_null_thing(), func, func.call_loc)
-            _job_loop(GuestDaemonJob(JobType.CALL_FUNC, func))
+            job = GuestDaemonJob(JobType.CALL_FUNC, func)
+            _job_loop(job)
 
     except d_CodeError as err:
         err.loc = func.call_loc
         # err.set_origin(
-        #    inter.body.path, func.call_loc, inter.char_feed.get_line(func.call_loc)
+        #    inter.body.path, func.call_loc, inter.token_cache.get_line(func.call_loc)
         # )
         raise err
     except d_DitError as err:
         err.add_trace(func.path, func.call_loc, func.name)
         raise err
     except ReturnController as ret:
-        if func.lang is not b_Ditlang:
-            job = GuestDaemonJob(JobType.RETURN_KEYWORD, func)
+        if job is not None:
+            # The guest is still waiting on the <| |> that returned
+            job.type_ = JobType.RETURN_KEYWORD
             run_job(job)
         return ret.token
     except d_TypeMismatchError as mis:
@@ -795,6 +754,8 @@ def _job_loop(job: GuestDaemonJob) -> None:
                 raise NotImplementedError
             mock_func = job.func.get_mock(res.result)
             value = interpret(mock_func)
+            if mock_func.token_cache:
+                job.func.keep_mock(res.result, mock_func.token_cache)
             job.type_ = JobType.DITLANG_CALLBACK
             if not value:
                 pass
@@ -827,7 +788,7 @@ def _arg_list(inter: InterpretContext, right: d_Grammar) -> List[ArgumentLocatio
             inter.comma_depth -= 1
             inter.advance_tokens()
             return args
-        loc = copy.deepcopy(inter.next_tok.loc)
+        loc = inter.next_tok.loc
         arg = _expression_dispatch(inter)
         if not arg:
             raise NotImplementedError
@@ -838,7 +799,7 @@ def _arg_list(inter: InterpretContext, right: d_Grammar) -> List[ArgumentLocatio
 def _import(inter: InterpretContext) -> Optional[d_Dit]:
     # import LINK
     # import NAMESPACE from LINK
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     name = None
 
     inter.advance_tokens(False)
@@ -863,7 +824,7 @@ def _import(inter: InterpretContext) -> Optional[d_Dit]:
 
 def _pull(inter: InterpretContext) -> None:
     # pull TARGET (as REPLACEMENT), ... from LINK
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     targets: List[Tuple[str, Optional[str]]] = []
     langs: List[Optional[d_Lang]] = []
     while True:
@@ -875,7 +836,7 @@ def _pull(inter: InterpretContext) -> None:
             raise d_SyntaxError("Expected name to pull from linked dit")
         # pull NAME ...
         target = inter.next_tok.word
-        loc = copy.deepcopy(inter.next_tok.loc)
+        loc = inter.next_tok.loc
         replacement = None
         inter.advance_tokens()
         if inter.next_tok.grammar == d_Grammar.AS:
@@ -921,7 +882,7 @@ def _pull(inter: InterpretContext) -> None:
             lang.set_value(result)
             result.attrs = lang.attrs  # TODO: proper unassigned lang logic
         else:
-            inter.body.attrs[d_Variable(result.name)] = result
+            inter.body.attrs[scope_key(result.name)] = result
     _import_or_pull_end(inter, dit, orig_loc)
 
 
@@ -990,7 +951,7 @@ def _clang(
     # class/lang NAME {||}
     # class/lang {||}; <- Anonymous version
     lang = None
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     clang_name = "class" if isinstance(clang, d_Class) else "lang"
 
     inter.advance_tokens(False)
@@ -1046,7 +1007,7 @@ def _sig(inter: InterpretContext) -> Optional[d_Func]:
             elif gra not in TYPES and gra not in DOTABLES:
                 raise d_SyntaxError("Expected type to follow listOf", dotable_loc)
             elif gra in DOTABLES:
-                dotable_loc = copy.deepcopy(inter.next_tok.loc)
+                dotable_loc = inter.next_tok.loc
 
         if gra == d_Grammar.FUNC:
             return _func(inter)
@@ -1076,7 +1037,7 @@ def _sig(inter: InterpretContext) -> Optional[d_Func]:
             lang.is_null = False
             lang.parent_scope = inter.body
             lang.name = inter.next_tok.word
-            inter.body.attrs[d_Variable(lang.name)] = lang
+            inter.body.attrs[scope_key(lang.name)] = lang
             func.lang = lang
         else:
             raise d_SyntaxError("Unrecognized token for signature")
@@ -1110,7 +1071,7 @@ def _sig_assign_return(inter: InterpretContext, func: d_Func) -> None:
 def _func(inter: InterpretContext) -> Optional[d_Func]:
     # func test(Str right, Str left) {||}
     # func () {||}
-    orig_loc = copy.deepcopy(inter.next_tok.loc)
+    orig_loc = inter.next_tok.loc
     func = _sig_or_func(inter)
     if not func.return_:
         func.return_ = d_Grammar.VOID
@@ -1201,19 +1162,12 @@ def _sig_or_func(inter: InterpretContext) -> d_Func:
 
 
 def _bar_brace_left(inter: InterpretContext, body: d_Body) -> None:
-    depth = 1
-    body.start_loc = copy.deepcopy(inter.char_feed.loc)
-    while depth > 0:
-        cur = inter.char_feed.current() + inter.char_feed.peek()
-        if cur == d_Grammar.BAR_BRACE_LEFT.value:
-            depth += 1
-            inter.advance_tokens()
-        elif cur == d_Grammar.BAR_BRACE_RIGHT.value:
-            depth -= 1
-            body.end_loc = copy.deepcopy(inter.char_feed.loc)
-            inter.advance_tokens()
-        else:
-            inter.char_feed.pop()
+    span = inter.read_body()
+    body.start_loc = span.start_loc
+    body.end_loc = span.end_loc
+    # Every body declared from the same span shares one view and its tokens
+    body.view = span.view
+    body.token_cache = span.token_cache
 
 
 def _handle_anon(
@@ -1229,7 +1183,7 @@ def _handle_anon(
             # activate priority comparison stuff
             lang.set_value(anon_body)
         else:
-            inter.body.attrs[d_Variable(anon_body.name)] = anon_body
+            inter.body.attrs[scope_key(anon_body.name)] = anon_body
         inter.named_statement = True
         return None
     else:
@@ -1240,8 +1194,7 @@ def _handle_anon(
 
 def _missing_terminal(inter: InterpretContext, message: str) -> NoReturn:
     tok = inter.curr_tok
-    target = tok.loc
-    code = inter.char_feed.get_line(target)
+    code = inter.token_cache.get_line(tok.loc)
 
     if isinstance(tok.grammar.value, str):
         length = len(tok.grammar.value)  # class, Str, =
@@ -1251,8 +1204,7 @@ def _missing_terminal(inter: InterpretContext, message: str) -> NoReturn:
         length = len(tok.word)  # New Names
 
     # Shift locaton to end of token
-    target.pos += length
-    target.col += length
+    target = CodeLocation(tok.loc.pos + length, tok.loc.col + length, tok.loc.line)
 
     err = d_SyntaxError(message, target)
     err.set_origin(inter.body.path, code)
@@ -1260,8 +1212,7 @@ def _missing_terminal(inter: InterpretContext, message: str) -> NoReturn:
 
 
 def _trigger_eof_err(inter: InterpretContext) -> NoReturn:
-    inter.char_feed.pop()
-    raise d_CriticalError("EOF reached, but failed to trigger")
+    raise d_EndOfFileError
 
 
 def _not_implemented(inter: InterpretContext) -> NoReturn:
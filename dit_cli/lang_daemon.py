@@ -7,13 +7,15 @@ import json
 import selectors
 import socket
 import subprocess
-import time
-from dataclasses import dataclass
-from threading import Thread
-from typing import List, Optional
+from dataclasses import dataclass, field
+from queue import Empty, SimpleQueue
+from threading import Event, Lock, Thread
+from typing import Callable, Dict, List, Optional, Tuple, Union
 
 from dit_cli.exceptions import d_CodeError, d_CriticalError, d_MissingPropError
+from dit_cli.guest_codec import decode_message, encode_job
 from dit_cli.oop import (
+    FRAME_HEADER,
     GuestDaemonJob,
     JobType,
     ReturnController,
@@ -22,11 +24,11 @@ from dit_cli.oop import (
 )
 
 """Dev note: much of this is copied from https://realpython.com/python-sockets/
-It's a little crude, and was intended for working with many clients that
-all have jobs at once, whereas this runs only 1 job at a time, linearly.
-It's good enough to solve the critical performance issue (subprocess.Popen ~= 100ms)
-and can be redesigned to send multiple jobs at once,
-when jobs are no longer processed linearly.
+Every job carries an id, which the guest sends back with each reply,
+and each client keeps a table of the jobs it has in flight.
+A guest can have several at once, such as a function that calls back into dit,
+which then calls another function in the same guest, and replies go to
+the job they name, whichever was sent last.
 You could also run make this multiprocessing, and have guest langs be multiprocessing
 but this is probably a long ways off."""
 
@@ -40,63 +42,89 @@ class d_Client:
     process: subprocess.Popen
     addr: Optional[int] = None
     key: Optional[selectors.SelectorKey] = None
+    # Bytes queued for the guest. The socket is only registered for writes
+    # while this is not empty, since an idle socket is always writable.
+    outbox: bytearray = field(default_factory=bytearray)
+    # Bytes received but not yet part of a whole message
+    inbox: bytearray = field(default_factory=bytearray)
+    # Whether the guest sends and expects length-prefixed frames.
+    # Guests written before framing send bare JSON, starting with '{'.
+    framed: bool = True
+    # Whether the guest asked for the binary encoding when it connected
+    binary: bool = False
+    # The id sent in place of each function, by guest_func_path
+    func_ids: Dict[str, int] = field(default_factory=dict)
+    # Jobs sent, or waiting for the guest to connect, by id,
+    # until the guest finishes or crashes them
+    jobs: Dict[int, GuestDaemonJob] = field(default_factory=dict)
+    # For guests that do not send ids back, which are only ever answering
+    # the job they were sent last
+    last_sent: Optional[int] = None
 
 
 PORT: Optional[int] = None
+LISTENING = Event()  # Set once PORT is assigned
 CLIENTS: List[d_Client] = []
-JOB: Optional[GuestDaemonJob] = None
+# Jobs from run_job, for the daemon thread to send
+PENDING: "SimpleQueue[GuestDaemonJob]" = SimpleQueue()
+# Held while checking for a lang's guest and starting it
+STARTING = Lock()
 SELECTOR: Optional[selectors.DefaultSelector] = None
+# run_job writes a byte here to wake the daemon when a job is pending
+WAKER: Optional[socket.socket] = None
+WAKE = object()  # Selector data for the other end of WAKER
+RECV_SIZE = 1 << 16
+DECODER = json.JSONDecoder()
+DAEMON: Optional[Thread] = None
 
 
 def start_daemon():
     """Starts the language daemon thread,
     which will manage all clients in other languages."""
-    Thread(target=_daemon_loop, daemon=True).start()
+    global DAEMON
+    if DAEMON is None:
+        DAEMON = Thread(target=_daemon_loop, daemon=True)
+        DAEMON.start()
 
 
 def kill_all():
     global CLIENTS, SELECTOR
     if len(CLIENTS) != 0:
-        for client in CLIENTS:
+        # Emptied first, so the daemon ignores anything these guests send now
+        clients, CLIENTS = CLIENTS, []
+        for client in clients:
             if client.key is not None and SELECTOR is not None:
                 SELECTOR.unregister(client.key.fileobj)
-            else:
-                raise NotImplementedError
+                client.key.fileobj.close()  # type: ignore
             client.process.kill()
-        CLIENTS = []
     if SELECTOR is not None:
         selectors = list(SELECTOR.get_map().items())
-        if len(selectors) != 1:
-            # The lang_daemon itself should still be registered.
+        if len(selectors) != 2:
+            # The lang_daemon and its waker should still be registered.
             raise NotImplementedError
 
 
 def run_job(job: GuestDaemonJob) -> GuestDaemonJob:
-    global CLIENTS, PORT, JOB
-    if job.type_ in (
+    """Hand a job to the daemon thread, and block until the guest answers.
+    Only this job is waited on, so run_job can be called from other threads."""
+    if job.type_ not in (
         JobType.CALL_FUNC,
         JobType.DITLANG_CALLBACK,
         JobType.RETURN_KEYWORD,
     ):
+        raise NotImplementedError
+    LISTENING.wait()
+    with STARTING:
         if job.func.lang not in [client.lang for client in CLIENTS]:
-            while True:
-                if PORT is not None:
-                    _start_guest(job.func.lang)
-                    break
-                else:
-                    time.sleep(0.001)
-        JOB = job
-        while True:
-            if JOB.type_ == JobType.FINISH_FUNC or JOB.type_ == JobType.EXE_DITLANG:
-                job = JOB
-                job.active = False
-                JOB = None
-                return job
-            elif JOB.crash:
-                raise JOB.crash
-            else:
-                time.sleep(0.001)
-    raise NotImplementedError
+            _start_guest(job.func.lang)
+    job.done.clear()
+    job.active = False
+    PENDING.put(job)
+    WAKER.send(b"\0")  # type: ignore
+    job.done.wait()
+    if job.crash:
+        raise job.crash
+    return job
 
 
 def _start_guest(lang: d_Lang):
@@ -112,31 +140,43 @@ def _start_guest(lang: d_Lang):
         path,
         daemon_path,
         str(PORT),
+        lang.name,
     ]
     proc = subprocess.Popen(cmd)
     CLIENTS.append(d_Client(lang, proc))
 
 
 def _daemon_loop():
-    """Starts the socket server and runs the main event loop"""
-    global PORT, SELECTOR
+    """Starts the socket server and runs the main event loop.
+    The loop only wakes when a guest sends something, a guest connects,
+    or run_job has a new job, so an idle daemon just blocks in select."""
+    global PORT, SELECTOR, WAKER
     # Sending port 0 will get a random open port
     with socket.create_server(("127.0.0.1", 0)) as daemon:
         daemon.listen()
         daemon.setblocking(False)
+        WAKER, wake_reader = socket.socketpair()
+        wake_reader.setblocking(False)
         SELECTOR = selectors.DefaultSelector()
         SELECTOR.register(daemon, selectors.EVENT_READ, data=None)
+        SELECTOR.register(wake_reader, selectors.EVENT_READ, data=WAKE)
         # Assign the port so it can be sent to clients
         PORT = daemon.getsockname()[1]
+        LISTENING.set()
 
         while True:  # This while will be destroyed only when the thread exits
             events = SELECTOR.select(timeout=None)
             for key, mask in events:
                 if key.data is None:
                     _accept_client(key.fileobj)  # type: ignore
+                elif key.data is WAKE:
+                    wake_reader.recv(1024)
+                    _send_pending()
                 else:
-                    _service_client(key, mask)
-            time.sleep(0.001)
+                    if mask & selectors.EVENT_READ:
+                        _service_client(key)
+                    if mask & selectors.EVENT_WRITE:
+                        _flush_client(key)
 
 
 def _accept_client(sock: socket.socket):
@@ -144,18 +184,28 @@ def _accept_client(sock: socket.socket):
     global SELECTOR, CLIENTS
     conn, addr = sock.accept()
     # { "type": "connect", "lang": "JavaScript"}
-    recv_data = _decode(conn.recv(1024))
-    if recv_data["type"] == "connect":
+    recv_data, framed = _recv_connect(conn)
+    if recv_data is not None and recv_data["type"] == "connect":
         if SELECTOR is None:
             raise NotImplementedError
         conn.setblocking(False)
         client = _get_client(recv_data["lang"])
         if client is None:
+            conn.close()
             return
-        events = selectors.EVENT_READ | selectors.EVENT_WRITE
-        key = SELECTOR.register(conn, events, data=client.lang.name)
+        key = SELECTOR.register(conn, selectors.EVENT_READ, data=client.lang.name)
         client.addr = addr
         client.key = key
+        client.framed = framed
+        if "encodings" in recv_data:
+            # Only guests that frame their messages can ask for an encoding
+            encoding = "binary" if "binary" in recv_data["encodings"] else "json"
+            client.binary = encoding == "binary"
+            reply = json.dumps({"type": "connect", "encoding": encoding}).encode()
+            client.outbox += FRAME_HEADER.pack(len(reply)) + reply
+        # The job that started this guest was queued before it connected
+        for job in list(client.jobs.values()):
+            _send_job(client, job)
 
 
 def _get_client(lang: str) -> Optional[d_Client]:
@@ -172,51 +222,205 @@ def _get_client(lang: str) -> Optional[d_Client]:
     # I just got this error to occur outside debug, in the CLI.
 
 
-def _service_client(key: selectors.SelectorKey, mask: int):
-    """Send or receive message from a guest lang."""
-    global JOB
+def _service_client(key: selectors.SelectorKey):
+    """Receive a message from a guest lang."""
     conn: socket.socket = key.fileobj  # type: ignore
     client = _get_client(key.data)
     if client is None:
         return
-    if JOB and mask & selectors.EVENT_READ:
-        recv_data = conn.recv(1024)
-        if recv_data:
-            data = _decode(recv_data)
-            if data["type"] == JobType.HEART.value:
-                pass
-            elif data["type"] == JobType.CRASH.value:
-                JOB.crash = d_CodeError(
-                    data["result"], JOB.func.lang.name, JOB.func.guest_func_path
-                )
-            elif data["type"] == JobType.EXE_DITLANG.value:
-                JOB.result = data["result"]
-                JOB.type_ = JobType.EXE_DITLANG
-            elif data["type"] == JobType.FINISH_FUNC.value:
-                JOB.type_ = JobType.FINISH_FUNC
-                JOB.active = False
-            else:
-                raise d_CriticalError("Unrecognized job type")
-
-    elif mask & selectors.EVENT_WRITE:
-        if (
-            JOB
-            and not JOB.active
-            and JOB.func.lang == client.lang
-            and JOB.type_
-            in (
-                JobType.CALL_FUNC,
-                JobType.DITLANG_CALLBACK,
-                JobType.RETURN_KEYWORD,
-                JobType.CLOSE,
-            )
-        ):
-            global PORT
-            mes = JOB.get_json()
-            conn.sendall(mes)
-            JOB.active = True
-
-
-def _decode(raw: bytes) -> dict:
+    try:
+        recv_data = conn.recv(RECV_SIZE)
+    except BlockingIOError:
+        return
+    if not recv_data:
+        _drop_client(client)
+        return
+    client.inbox += recv_data
+    if client.binary:
+        messages = _read_frames(client.inbox, decode_message)
+    elif client.framed:
+        messages = _read_frames(client.inbox)
+    else:
+        messages = _read_bare_json(client.inbox)
+    for data in messages:
+        _handle_message(client, data)
+
+
+def _handle_message(client: d_Client, data: dict):
+    """Update the job a message from a guest is for"""
+    if data["type"] == JobType.HEART.value:
+        return
+    job = client.jobs.get(data.get("id", client.last_sent))  # type: ignore
+    if job is None:
+        return  # Nobody is waiting on this reply
+    if data["type"] == JobType.CRASH.value:
+        job.crash = d_CodeError(
+            data["result"], job.func.lang.name, job.func.guest_func_path
+        )
+    elif data["type"] == JobType.EXE_DITLANG.value:
+        job.result = data["result"]
+        job.type_ = JobType.EXE_DITLANG
+    elif data["type"] == JobType.FINISH_FUNC.value:
+        job.type_ = JobType.FINISH_FUNC
+    else:
+        raise d_CriticalError("Unrecognized job type")
+    if data["type"] != JobType.EXE_DITLANG.value:
+        del client.jobs[job.id_]
+    job.active = False
+    job.done.set()
+
+
+def _send_pending():
+    """Add each job from run_job to its client's table, and send it"""
+    while True:
+        try:
+            job = PENDING.get_nowait()
+        except Empty:
+            return
+        client = _get_client(job.func.lang.name)
+        if client is None:
+            _fail_job(job)  # The guest was dropped since run_job started it
+            continue
+        client.jobs[job.id_] = job
+        _send_job(client, job)
+
+
+def _send_job(client: d_Client, job: GuestDaemonJob):
+    """Send a job to its guest, if it has not been sent and the guest is connected"""
+    if job.active or client.key is None:
+        return  # _accept_client will send it once the guest connects
+    if client.binary:
+        client.outbox += _binary_job(client, job)
+    else:
+        client.outbox += job.get_json(client.framed)
+    job.active = True
+    client.last_sent = job.id_
+    _flush_client(client.key)
+
+
+def _binary_job(client: d_Client, job: GuestDaemonJob) -> bytes:
+    """Frame job in the binary encoding, sending the function's name and path
+    only the first time it is sent to this guest."""
+    path = job.func.guest_func_path
+    define = path not in client.func_ids
+    if define:
+        client.func_ids[path] = len(client.func_ids)
+    payload = encode_job(job, client.func_ids[path], define)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _flush_client(key: selectors.SelectorKey):
+    """Send as much of a guest's outbox as its socket takes without blocking,
+    and only watch for the socket being writable while anything is left."""
+    client = _get_client(key.data)
+    if client is None or SELECTOR is None:
+        return
+    conn: socket.socket = key.fileobj  # type: ignore
+    try:
+        sent = conn.send(client.outbox)
+    except BlockingIOError:
+        sent = 0
+    del client.outbox[:sent]
+    events = selectors.EVENT_READ
+    if client.outbox:
+        events |= selectors.EVENT_WRITE
+    if events != key.events:
+        client.key = SELECTOR.modify(conn, events, data=key.data)
+
+
+def _drop_client(client: d_Client):
+    """The guest closed its socket, so any job waiting on it will never finish"""
+    global CLIENTS
+    if SELECTOR is not None and client.key is not None:
+        SELECTOR.unregister(client.key.fileobj)
+        client.key.fileobj.close()  # type: ignore
+    CLIENTS = [other for other in CLIENTS if other is not client]
+    for job in client.jobs.values():
+        _fail_job(job)
+    client.jobs.clear()
+
+
+def _fail_job(job: GuestDaemonJob):
+    job.crash = d_CodeError(
+        "The guest daemon exited", job.func.lang.name, job.func.guest_func_path
+    )
+    job.done.set()
+
+
+def _decode(raw: Union[bytes, bytearray]) -> dict:
     """Convert client messages into dictionaries"""
-    return json.loads(raw.decode())
+    return json.loads(raw)
+
+
+def _recv_connect(conn: socket.socket) -> Tuple[Optional[dict], bool]:
+    """Read the connect message a guest sends first, still blocking,
+    and whether the guest uses frames."""
+    head = _recv_exactly(conn, FRAME_HEADER.size)
+    if head[:1] != b"{":
+        if len(head) < FRAME_HEADER.size:
+            return None, False  # Closed before it sent anything to read
+        (size,) = FRAME_HEADER.unpack(head)
+        payload = _recv_exactly(conn, size)
+        if len(payload) < size:
+            return None, True
+        return _decode(payload), True
+    # A bare JSON connect, which ends once it parses
+    raw = bytearray(head)
+    while True:
+        messages = _read_bare_json(raw)
+        if messages:
+            return messages[0], False
+        chunk = conn.recv(1024)
+        if not chunk:
+            return None, False
+        raw += chunk
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    """Read size bytes from a blocking socket, or fewer if it closes"""
+    raw = bytearray()
+    while len(raw) < size:
+        chunk = conn.recv(size - len(raw))
+        if not chunk:
+            break
+        raw += chunk
+    return bytes(raw)
+
+
+def _read_frames(
+    inbox: bytearray, decode: Callable[[bytes], dict] = _decode
+) -> List[dict]:
+    """Take every whole frame from the front of inbox,
+    leaving a frame that has only partly arrived."""
+    messages = []
+    start = 0
+    while len(inbox) - start >= FRAME_HEADER.size:
+        (size,) = FRAME_HEADER.unpack_from(inbox, start)
+        end = start + FRAME_HEADER.size + size
+        if len(inbox) < end:
+            break
+        messages.append(decode(inbox[start + FRAME_HEADER.size : end]))
+        start = end
+    del inbox[:start]
+    return messages
+
+
+def _read_bare_json(inbox: bytearray) -> List[dict]:
+    """Take every whole JSON object from the front of inbox,
+    for guests that do not frame their messages."""
+    try:
+        text = inbox.decode()
+    except UnicodeDecodeError:
+        return []  # A character is split between reads
+    messages = []
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        try:
+            message, pos = DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        messages.append(message)
+    del inbox[: len(text[:pos].encode())]
+    return messages
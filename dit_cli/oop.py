@@ -1,10 +1,26 @@
 from __future__ import annotations
 
-import copy
 import json
-from dataclasses import dataclass
+import struct
+import sys
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
 from enum import Enum
-from typing import Callable, Dict, Iterator, List, Optional, Union
+from itertools import count
+from threading import Event
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
 from urllib.error import HTTPError, URLError
 from urllib.request import urlopen
 
@@ -24,8 +40,28 @@ from dit_cli.grammar import (
 )
 from dit_cli.settings import CodeLocation
 
+if TYPE_CHECKING:
+    from dit_cli.interpret_context import TokenCache
+
 
 class d_Thing(object):
+    # Every subclass shares these slots, since set_value changes the class of a
+    # Thing into whatever it's assigned, and Python only allows that between
+    # classes with the same slots. Str, Bool, and Num, by far the most common
+    # things, only ever use these. Anything else goes in a __dict__,
+    # which is only made for things that need one.
+    __slots__ = (
+        "public_type",
+        "grammar",
+        "name",
+        "can_be_anything",
+        "is_null",
+        "is_built_in",
+        "str_",
+        "bool_",
+        "num",
+        "__dict__",
+    )
     null_singleton: Optional[d_Thing] = None
 
     def __init__(self) -> None:
@@ -91,7 +127,13 @@ class d_Thing(object):
         return self
 
 
+# The slot every thing keeps its name in, which d_Class hides behind a property
+THING_NAME = d_Thing.name
+
+
 class d_Ref(object):
+    __slots__ = ("name", "target")
+
     def __init__(self, name: str, target: d_Thing) -> None:
         self.name = name
         self.target = target
@@ -116,6 +158,8 @@ Ref_Thing = Union[d_Thing, d_Ref]
 
 
 class d_Str(d_Thing):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Str"
@@ -137,6 +181,8 @@ class d_Str(d_Thing):
 
 
 class d_Bool(d_Thing):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Bool"
@@ -158,6 +204,8 @@ class d_Bool(d_Thing):
 
 
 class d_Num(d_Thing):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Num"
@@ -179,13 +227,30 @@ class d_Num(d_Thing):
 
 
 class d_List(d_Thing):
+    __slots__ = ()
+    # The items last checked by _check_list_type, and every type they passed
+    verified: Optional[Tuple[Union[List[d_Thing], PackedValues], Set[d_Type]]] = None
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "List"
         self.grammar = d_Grammar.VALUE_LIST
 
         self.contained_type: d_Type = None  # type: ignore
-        self.list_: List[d_Thing] = None  # type: ignore
+        # The things in the list, or just their values, if they could be packed
+        self.items: Union[List[d_Thing], PackedValues] = None  # type: ignore
+
+    @property
+    def list_(self) -> List[d_Thing]:
+        """The things in the list. A packed list makes new ones every time."""
+        if isinstance(self.items, PackedValues):
+            return self.items.things()
+        return self.items
+
+    @list_.setter
+    def list_(self, things: List[d_Thing]) -> None:
+        packed = PackedValues.from_things(things)
+        self.items = packed if packed is not None else things
 
     def __str__(self) -> str:
         return json.dumps(self.get_data())
@@ -194,8 +259,10 @@ class d_List(d_Thing):
         return self.__str__()
 
     def get_data(self) -> list:
+        if isinstance(self.items, PackedValues):
+            return self.items.get_data()
         out = []
-        for item in self.list_:
+        for item in self.items:
             out.append(item.get_data())
         return out
 
@@ -203,7 +270,8 @@ class d_List(d_Thing):
         self.is_null = new_value.is_null
         if isinstance(new_value, d_List):
             # listOf Str = ['1', '2'];
-            self.list_ = new_value.list_
+            self.items = new_value.items
+            self.verified = new_value.verified
             _check_list_type(self)
         elif self.can_be_anything:
             super().set_value(new_value)
@@ -220,29 +288,147 @@ def _check_list_type(list_: d_List) -> None:
     elif list_.contained_type == d_Grammar.VALUE_THING:
         return
 
-    err = False
-    for ele in _traverse(list_.list_):
-        res = check_value(ele, Declarable(list_.contained_type))
-        if res:
-            raise d_TypeMismatchError(
-                f"List of type '{res.expected}' contained '{res.actual}'{res.extra}"
-            )
+    type_ = list_.contained_type
+    verified = list_.verified
+    if verified is not None and verified[0] is list_.items and type_ in verified[1]:
+        return
+    fixed = _check_items(list_.items, Declarable(type_))
+    if fixed and not isinstance(type_, d_Class):
+        # Whether an inst is of a class can change along with its Parents
+        if verified is None or verified[0] is not list_.items:
+            list_.verified = verified = (list_.items, set())
+        verified[1].add(type_)
+
+
+def _check_items(items: Union[List[d_Thing], PackedValues], dec: Declarable) -> bool:
+    """Check every item, including those in nested lists, against dec.
+    Returns whether none of them can ever change. Things in a variable can be
+    given a new value, but nameless things, which are never in one, can't."""
+    if isinstance(items, PackedValues):
+        # Every value is the same primitive, so any one can stand for them all
+        _check_item(items.thing(0), dec)
+        return True
+    fixed = True
+    for item in items:
+        if item.name is not None:
+            fixed = False
+        if isinstance(item, d_List):
+            fixed = _check_items(item.items, dec) and fixed
+        else:
+            _check_item(item, dec)
+    return fixed
 
 
-def _traverse(item: Union[list, d_Thing]) -> Iterator[d_Thing]:
-    """Generate every item in an arbitrary nested list,
-    or just the item if it wasn't a list in the first place"""
-    if isinstance(item, list):
-        for i in item:
-            yield from _traverse(i)
-    elif isinstance(item, d_List):
-        for j in item.list_:
-            yield from _traverse(j)
-    else:
-        yield item
+def _check_item(item: d_Thing, dec: Declarable) -> None:
+    res = check_value(item, dec)
+    if res:
+        raise d_TypeMismatchError(
+            f"List of type '{res.expected}' contained '{res.actual}'{res.extra}"
+        )
+
+
+class PackedValues:
+    """The values of a list made only of Nums, only of Bools, or only of Strs,
+    kept without a d_Thing for each one. Nums are doubles in an array,
+    with a byte for each that says if it was an int. Bools are a byte each.
+    Strs are just the strs.
+    Things in a list can also be in a variable, and change along with it,
+    so only things without a name are ever packed."""
+
+    __slots__ = ("grammar", "values", "ints")
+
+    def __init__(
+        self,
+        grammar: d_Grammar,
+        values: Union[array, bytearray, List[str]],
+        ints: Optional[bytearray] = None,
+    ) -> None:
+        self.grammar: d_Grammar = grammar
+        self.values: Union[array, bytearray, List[str]] = values
+        self.ints: Optional[bytearray] = ints  # None if there were none
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @classmethod
+    def from_things(cls, things: Optional[List[d_Thing]]) -> Optional[PackedValues]:
+        """Pack things, if they are all nameless and of the same primitive"""
+        if not things:
+            return None
+        kind = type(things[0])
+        if kind not in PACKED_TYPES:
+            return None
+        for thing in things:
+            if type(thing) is not kind or thing.is_null or thing.name is not None:
+                return None
+        return cls.from_data([thing.get_data() for thing in things])
+
+    @classmethod
+    def from_data(cls, data: list) -> Optional[PackedValues]:
+        """Pack the data of a list, as given by get_data,
+        if it is all bools, all strs, or all numbers"""
+        if not data:
+            return None
+        kind = type(data[0])
+        if kind is bool:
+            if all(type(value) is bool for value in data):
+                return cls(d_Grammar.VALUE_BOOL, bytearray(data))
+        elif kind is str:
+            if all(type(value) is str for value in data):
+                return cls(d_Grammar.VALUE_STR, list(data))
+        elif kind is int or kind is float:
+            ints = bytearray(len(data))
+            for index, value in enumerate(data):
+                if type(value) is int:
+                    if abs(value) > MAX_EXACT_INT:
+                        return None  # Would be rounded as a double
+                    ints[index] = 1
+                elif type(value) is not float:
+                    return None
+            if not any(ints):
+                return cls(d_Grammar.VALUE_NUM, array("d", data))
+            return cls(d_Grammar.VALUE_NUM, array("d", data), ints)
+        return None
+
+    def get_data(self) -> list:
+        if self.grammar == d_Grammar.VALUE_NUM:
+            if self.ints is None:
+                return self.values.tolist()  # type: ignore
+            return [
+                int(value) if is_int else value
+                for value, is_int in zip(self.values, self.ints)
+            ]
+        elif self.grammar == d_Grammar.VALUE_BOOL:
+            return [value == 1 for value in self.values]
+        return list(self.values)
+
+    def thing(self, index: int) -> d_Thing:
+        """A new thing for the value at index"""
+        value = self.values[index]
+        if self.grammar == d_Grammar.VALUE_NUM:
+            thing = d_Num()
+            thing.num = int(value) if self.ints and self.ints[index] else value
+        elif self.grammar == d_Grammar.VALUE_BOOL:
+            thing = d_Bool()
+            thing.bool_ = value == 1
+        else:
+            thing = d_Str()
+            thing.str_ = value  # type: ignore
+        thing.is_null = False
+        return thing
+
+    def things(self) -> List[d_Thing]:
+        return [self.thing(index) for index in range(len(self.values))]
+
+
+# Anything bigger might not be the same int after being stored as a double
+MAX_EXACT_INT = 2 ** 53
+PACKED_TYPES = (d_Num, d_Bool, d_Str)
 
 
 class d_JSON(d_Thing):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "JSON"
@@ -300,23 +486,41 @@ def _simple_set_value(self: simple_types, val: d_Thing) -> None:
 
 class d_Variable:
     """
-    Stores a string name and a list of prefixes.
+    Stores a string name and a tuple of prefixes.
     The prefixes are only used with inheritance.
     In all other cases, it basically just uses the name.
     Names are unique within each scope.
+    Every attrs is keyed by these, so they can't be changed once made,
+    and are hashed only once, when they are made.
     """
 
-    def __init__(self, name: str, prefix: Optional[List[d_Class]] = None) -> None:
-        self.name: str = name
-        self.prefix: List[d_Class] = prefix or []
+    __slots__ = ("name", "prefix", "hash")
+
+    def __init__(self, name: str, prefix: Tuple[d_Class, ...] = ()) -> None:
+        # Interned names are compared by identity when keys are probed
+        name = sys.intern(name)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "prefix", prefix)
+        object.__setattr__(self, "hash", hash((name, prefix)))
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"d_Variable is immutable, cannot set '{name}'")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"d_Variable is immutable, cannot delete '{name}'")
+
+    def __reduce__(self) -> tuple:
+        return (d_Variable, (self.name, self.prefix))
 
     def __hash__(self) -> int:
-        return hash((self.name, tuple(self.prefix)))
+        return self.hash
 
     def __eq__(self, o: object) -> bool:
-        if not isinstance(o, d_Variable):
+        if self is o:
+            return True
+        elif not isinstance(o, d_Variable):
             return False
-        elif self.name != o.name:
+        elif self.hash != o.hash or self.name != o.name:
             return False
         elif self.prefix != o.prefix:
             return False
@@ -330,27 +534,146 @@ class d_Variable:
         return out + "]"
 
 
+class AttrDict(Dict[d_Variable, "Ref_Thing"]):
+    """The attrs of a container, which counts every change made to it.
+    Anything found by searching through it can be trusted until the count moves."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.version: int = 0
+
+    def __setitem__(self, key: d_Variable, value: Ref_Thing) -> None:
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key: d_Variable) -> None:
+        super().__delitem__(key)
+        self.version += 1
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def setdefault(self, *args):
+        self.version += 1
+        return super().setdefault(*args)
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
+
+
+class Shape:
+    """Where each attr of an instance is kept in its values.
+    Instances given the same attrs in the same order share one shape,
+    and adding an attr moves an instance on to the shape after it,
+    which is only made the first time any instance takes that step."""
+
+    __slots__ = ("offsets", "transitions")
+
+    def __init__(self, offsets: Dict[d_Variable, int]) -> None:
+        self.offsets: Dict[d_Variable, int] = offsets
+        self.transitions: Dict[d_Variable, Shape] = {}
+
+    def add(self, key: d_Variable) -> Shape:
+        shape = self.transitions.get(key)
+        if shape is None:
+            offsets = dict(self.offsets)
+            offsets[key] = len(offsets)
+            shape = self.transitions[key] = Shape(offsets)
+        return shape
+
+
+# Every instance starts with no attrs
+EMPTY_SHAPE = Shape({})
+
+
+class InstAttrs(MutableMapping[d_Variable, "Ref_Thing"]):
+    """The attrs of an instance, as a shape shared with other instances,
+    and a list of just this instance's values."""
+
+    __slots__ = ("shape", "values_")
+
+    def __init__(self) -> None:
+        self.shape: Shape = EMPTY_SHAPE
+        self.values_: List[Ref_Thing] = []
+
+    def get(
+        self, key: d_Variable, default: Optional[Ref_Thing] = None
+    ) -> Optional[Ref_Thing]:
+        index = self.shape.offsets.get(key)
+        return default if index is None else self.values_[index]
+
+    def __getitem__(self, key: d_Variable) -> Ref_Thing:
+        return self.values_[self.shape.offsets[key]]
+
+    def __setitem__(self, key: d_Variable, value: Ref_Thing) -> None:
+        index = self.shape.offsets.get(key)
+        if index is None:
+            self.shape = self.shape.add(key)
+            self.values_.append(value)
+        else:
+            self.values_[index] = value
+
+    def __delitem__(self, key: d_Variable) -> None:
+        # Rare enough to just give the rest their attrs over again
+        index = self.shape.offsets[key]
+        items = list(zip(self.shape.offsets, self.values_))
+        del items[index]
+        self.shape = EMPTY_SHAPE
+        self.values_ = []
+        for other, value in items:
+            self[other] = value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.shape.offsets
+
+    def __iter__(self) -> Iterator[d_Variable]:
+        return iter(list(self.shape.offsets))
+
+    def __len__(self) -> int:
+        return len(self.values_)
+
+    def clear(self) -> None:
+        self.shape = EMPTY_SHAPE
+        self.values_ = []
+
+
 class d_Container(d_Thing):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
-        self.attrs: Dict[d_Variable, Ref_Thing] = {}
-
-    def find_attr(self, name: str, scope_mode: bool = False) -> Optional[d_Thing]:
-        var = d_Variable(name)
-        if isinstance(self, d_Inst):
-            var = self.compose_prefix(name)
+        self.attrs: Dict[d_Variable, Ref_Thing] = AttrDict()
+
+    def find_attr(
+        self,
+        name: str,
+        scope_mode: bool = False,
+        site: Optional[List[Lookup]] = None,
+    ) -> Optional[d_Thing]:
         if scope_mode:
             if not isinstance(self, d_Body):
                 raise d_CriticalError("A Container was given for scope mode")
             # We need to check for this name in upper scopes
             # Str someGlobal = 'cat';
             # class someClass {| Str someInternal = someGlobal; |}
-            return _find_attr_in_scope(var, self)
-        else:
-            # We're dotting, so only 'self' counts, no upper scopes.
+            return _find_attr_in_scope(scope_key(name), self)
+        # We're dotting, so only 'self' counts, no upper scopes.
+        if isinstance(self, d_Inst):
             # We also need to check for inherited parent classes
             # someInst.someMember = ...
-            return _find_attr_in_self(var, self)
+            return _find_attr_in_inst(self.compose_prefix(name), self, site)
+        ref = self.attrs.get(scope_key(name))
+        return ref.get_thing() if ref is not None else None
 
     def set_value(self, val: d_Thing) -> None:
         self.is_null = val.is_null
@@ -361,6 +684,7 @@ class d_Container(d_Thing):
             self.attrs = val.attrs  # type: ignore
             self.parent_scope = val.parent_scope  # type: ignore
             self.view = val.view  # type: ignore
+            self.token_cache = val.token_cache  # type: ignore
             self.path = val.path  # type: ignore
         elif self.can_be_anything:
             super().set_value(val)
@@ -397,9 +721,10 @@ class d_Container(d_Thing):
             value = _type_to_obj(dec)
 
         fin_val = ref or value
-        fin_var = d_Variable(fin_val.name)
         if isinstance(self, d_Inst):
             fin_var = self.compose_prefix(fin_val.name)
+        else:
+            fin_var = scope_key(fin_val.name)
 
         self.attrs[fin_var] = fin_val
         return value
@@ -409,71 +734,145 @@ def _check_for_duplicates(thing: d_Container, name: str) -> None:
     if isinstance(thing, d_Inst):
         var = thing.compose_prefix(name)
     else:
-        var = d_Variable(name)
+        var = scope_key(name)
     if var in thing.attrs:
         raise d_CriticalError(f"A duplicate attribute was found: '{name}'")
 
 
 def _find_attr_in_scope(var: d_Variable, body: d_Body) -> Optional[d_Thing]:
-    if var in body.attrs:
-        return body.attrs[var].get_thing()
-    elif body.parent_scope:
-        return _find_attr_in_scope(var, body.parent_scope)
-    else:
-        return None
+    # Every name is looked up this way, usually many times over,
+    # so this is a plain loop instead of recursing through each scope
+    while body is not None:
+        found = body.attrs.get(var)
+        if found is not None:
+            return found.get_thing()
+        body = body.parent_scope
+    return None
+
+
+def scope_key(name: str) -> d_Variable:
+    """The key for name in a body's attrs, made once and shared by every
+    lookup of that name in every scope."""
+    var = SCOPE_KEYS.get(name)
+    if var is None:
+        var = SCOPE_KEYS[name] = d_Variable(name)
+    return var
 
 
-def _find_attr_in_self(
-    var: d_Variable,
-    con: d_Container,
-    orig_inst: d_Inst = None,
-    search_record: d_Variable = None,
+# Bodies never have prefixes, so the key for each name is always the same
+SCOPE_KEYS: Dict[str, d_Variable] = {}
+
+
+def _find_attr_in_inst(
+    var: d_Variable, inst: d_Inst, site: Optional[List[Lookup]] = None
 ) -> Optional[d_Thing]:
     """
-    Find an attribute within the target container.
-    `var` is the original variable we were given, and `con` is the current container.
-    `orig_inst` is the instance we started checking in, which we store when
-    we start searching in inherited parent classes.
-    `search_record` lists every class we've checked through so currently.
-
-    This is is indirectly recursive with `_search_inherited_parents`, so this
-    will be called several times to search through different containers.
+    Find an attribute within an instance, or any class it inherits from.
+    Every search is kept as a Lookup in the lineage of the instance's class,
+    and in `site` as well, the inline cache of the dot in the code that made it.
+    Until a class it went through changes, the search is repeated by probing
+    the instance's own attrs for each key they were checked for last time.
+    Where that finds the attr only depends on the shape of the instance,
+    so after the first instance of each shape it is just an index.
     """
-    res = _search_current_attrs(var, con, orig_inst, search_record)
-    if res:
-        return res
-    if isinstance(con, d_Inst):
-        # If we're an instance, we only have one parent, recurse on that parent
-        return _find_attr_in_self(var, con.parent, con)
-    if isinstance(con, d_Class) and orig_inst:
-        # If we're a class, we might have parents, so we need to recurse
-        return _search_inherited_parents(var, con, orig_inst, search_record)
+    class_ = inst.parent
+    lookup = _cached_lookup(var, class_, site)
+    if lookup is not None and lookup.holds():
+        attrs = inst.attrs
+        hit = lookup.hits.get(attrs.shape)
+        if hit is None:
+            hit = lookup.hits[attrs.shape] = lookup.probe(attrs.shape)
+        index, pushed = hit
+        if index >= 0:
+            inst.cur_prefix.extend(pushed)
+            return attrs.values_[index].get_thing()
+        if lookup.complete:
+            return lookup.repeat(inst)
+
+    lineage = class_.get_lineage()
+    lookup = Lookup(var, class_)
+    result = _search_lineage(var, inst, lineage, lookup)
+    lineage.lookups[var] = lookup
+    if site is not None:
+        # Replacing the one that no longer held, if there was one
+        site[:] = [
+            cached
+            for cached in site
+            if cached.class_ is not class_ or cached.var != var
+        ]
+        site.insert(0, lookup)
+        del site[SITE_SIZE:]
+    return result
+
+
+def _cached_lookup(
+    var: d_Variable, class_: d_Class, site: Optional[List[Lookup]]
+) -> Optional[Lookup]:
+    if site is not None:
+        for lookup in site:
+            if lookup.class_ is class_ and lookup.var == var:
+                return lookup
+    if class_.lineage is not None:
+        return class_.lineage.lookups.get(var)
     return None
 
 
-def _search_current_attrs(
-    var: d_Variable,
-    con: d_Container,
-    orig_inst: d_Inst = None,
-    search_record: d_Variable = None,
+def _search_lineage(
+    var: d_Variable, inst: d_Inst, lineage: Lineage, lookup: Lookup
 ) -> Optional[d_Thing]:
-    if var in con.attrs:
+    """
+    Search `inst`, then every class in its lineage, in order, for `var`.
+    Each class is searched for `var` itself, then for the name behind the
+    prefix of parents searched through to reach it. That is the key an
+    attribute assigned from inside that parent would have in the instance.
+    Each class is also checked for a parent named `var`,
+    for explicit name disambiguation: `this.B.attribute`.
+    `lookup` records every step, so the search can be repeated.
+    """
+    lookup.check(inst, var, ())
+    ref = inst.attrs.get(var)
+    if ref is not None:
         # Maybe its an exact match!
-        return con.attrs[var].get_thing()
+        return ref.get_thing()
 
-    if not search_record:
-        # if we're not searching through inherited parents, we can just return
-        return None
-
-    for target in (con, orig_inst):
-        # The var might be behind a prefix
-        # We need to check both the inheriting class and the original instance
-        if not target:
-            continue
-        if _do_prefixes_match(var, search_record):
-            if search_record in target.attrs:
-                # the prefixes might match, but the variable might not actually exist
-                return target.attrs[search_record].get_thing()
+    index = 0
+    class_, path = lineage.classes[0]
+    while True:
+        lookup.check(class_, var, path)
+        ref = class_.attrs.get(var)
+        if ref is not None:
+            lookup.found(ref.get_thing(), path)
+            return lookup.repeat(inst)
+
+        if path:
+            # The var might be behind a prefix
+            # We need to check both the inheriting class and the original instance
+            record = d_Variable(var.name, path)
+            if _do_prefixes_match(var, record):
+                ref = class_.attrs.get(record)
+                if ref is not None:
+                    lookup.found(ref.get_thing(), path)
+                    return lookup.repeat(inst)
+                lookup.check(inst, record, path)
+                ref = inst.attrs.get(record)
+                if ref is not None:
+                    inst.cur_prefix.extend(path)
+                    return ref.get_thing()
+
+        parents = lineage.parents_of(index)
+        lookup.parents.append(lineage.parents[index])
+        # check if we're looking for an explicit parent
+        for parent in parents:
+            if var.name == parent.name:
+                lookup.found(parent, path, explicit=True)
+                return lookup.repeat(inst)
+
+        next_class = lineage.next_class(index)
+        if next_class is None:
+            lookup.complete = True
+            return None
+        index += 1
+        class_, path = next_class
 
 
 def _do_prefixes_match(given_var: d_Variable, search_record: d_Variable) -> bool:
@@ -512,40 +911,140 @@ def _do_prefixes_match(given_var: d_Variable, search_record: d_Variable) -> bool
                 return False
 
 
-def _search_inherited_parents(
-    var: d_Variable,
-    class_: d_Class,
-    orig_inst: d_Inst,
-    search_record: d_Variable = None,
-) -> Optional[d_Thing]:
+class Lineage:
     """
-    Search through the parents of `class_` to see if we can find `var`.
+    The parent graph of a class, flattened into the order that an instance
+    searches through it for a name, depth first, along with the path of parents
+    taken to reach each class. That path is pushed onto the instance's prefix
+    when a name is found there.
+    Classes are only listed as far as any search has needed, since reading the
+    Parents of a class can fail, and must only fail where searching always has.
     """
-    parents = class_.get_parents()
-    if not parents:
+
+    def __init__(self, class_: d_Class) -> None:
+        self.classes: List[Tuple[d_Class, Tuple[d_Class, ...]]] = [(class_, ())]
+        # The Parents of each class listed so far, and the classes in it
+        self.parents: List[Tuple[Optional[d_List], List[d_Class]]] = []
+        # The parents still to be listed, at each depth of the walk
+        self.pending: List[Tuple[Tuple[d_Class, ...], Iterator[d_Class]]] = []
+        # Every search made through this lineage, by the var searched for
+        self.lookups: Dict[d_Variable, Lookup] = {}
+
+    def holds(self) -> bool:
+        """Whether the Parents of every class listed are still the same"""
+        for (class_, _), (parents, list_) in zip(self.classes, self.parents):
+            if class_.attrs.get(scope_key(PARENTS)) is not parents:
+                return False
+            if parents is not None and parents.list_ is not list_:
+                return False
+        return True
+
+    def parents_of(self, index: int) -> List[d_Class]:
+        """The parents of the class at index, read the first time they're needed"""
+        if index == len(self.parents):
+            class_, path = self.classes[index]
+            parents = class_.get_parents()
+            list_ = parents.list_ if parents is not None else []
+            self.parents.append((parents, list_))  # type: ignore
+            self.pending.append((path, iter(list_)))  # type: ignore
+        return self.parents[index][1]
+
+    def next_class(self, index: int) -> Optional[Tuple[d_Class, Tuple[d_Class, ...]]]:
+        """The class searched after the one at index, whose parents must be read"""
+        if index + 1 < len(self.classes):
+            return self.classes[index + 1]
+        while self.pending:
+            path, rest = self.pending[-1]
+            parent = next(rest, None)
+            if parent is None:
+                self.pending.pop()
+                continue
+            if len(path) >= sys.getrecursionlimit():
+                # Parents that inherit from themselves never run out
+                raise RecursionError("maximum recursion depth exceeded")
+            self.classes.append((parent, path + (parent,)))
+            return self.classes[-1]
         return None
 
-    # check if we're looking for an explicit parent
-    for parent in parents.list_:  # type: ignore
-        parent: d_Class
-        if var.name == parent.name:
-            orig_inst.clear_prefix_to_class()
-            orig_inst.add_parent_prefix(parent)
-            orig_inst.add_class_sep()
-            return parent
-
-    # Now we manually search the entire parent graph.
-    # search_record will remember the prefix of our current search context.
-    # We will use it to check the instance attrs for matches.
-    search_record = search_record or d_Variable(var.name)
-    for parent in parents.list_:  # type: ignore
-        search_record.prefix.append(parent)
-        orig_inst.add_parent_prefix(parent)
-        result = _find_attr_in_self(var, parent, orig_inst, search_record)
-        if result:
-            return result
-        search_record.prefix.pop()
-        orig_inst.pop_parent_prefix()
+
+class Lookup:
+    """The steps taken by one search for a name in an instance, through its class
+    and inherited parents, so that the same search can be repeated without
+    walking the parent graph again.
+
+    What the search found in classes holds for as long as none of their attrs
+    or Parents change. Only the instance's own attrs differ between instances
+    of the same class, so every key they were checked for is kept, in order."""
+
+    def __init__(self, var: d_Variable, class_: d_Class) -> None:
+        self.var: d_Variable = var
+        self.class_: d_Class = class_
+        # Each key checked in the instance, with the parents that had been
+        # added to its prefix by then
+        self.probes: List[Tuple[d_Variable, Tuple[d_Class, ...]]] = []
+        # Each class checked, with its attrs and their version at the time
+        self.guards: List[Tuple[d_Class, AttrDict, int]] = []
+        self.parents: List[Tuple[Optional[d_List], List[d_Class]]] = []
+        # False if the search stopped in the instance, before any of this was known
+        self.complete: bool = False
+        self.result: Optional[d_Thing] = None
+        self.pushed: Tuple[d_Class, ...] = ()
+        self.explicit: bool = False
+        self.renames: int = d_Class.renames
+        # Where the first probe found is kept, for each shape of instance it
+        # was repeated in. The same keys are always at the same offsets.
+        self.hits: Dict[Shape, Tuple[int, Tuple[d_Class, ...]]] = {}
+
+    def check(
+        self, con: d_Container, key: d_Variable, pushed: Tuple[d_Class, ...]
+    ) -> None:
+        if isinstance(con, d_Inst):
+            self.probes.append((key, pushed))
+        elif not self.guards or self.guards[-1][0] is not con:
+            self.guards.append((con, con.attrs, con.attrs.version))  # type: ignore
+
+    def found(
+        self, result: d_Thing, pushed: Tuple[d_Class, ...], explicit: bool = False
+    ) -> None:
+        self.complete = True
+        self.result = result
+        self.pushed = pushed
+        self.explicit = explicit
+
+    def probe(self, shape: Shape) -> Tuple[int, Tuple[d_Class, ...]]:
+        """The offset of the first probe an instance of this shape has,
+        or -1 if it has none of them"""
+        for key, pushed in self.probes:
+            index = shape.offsets.get(key)
+            if index is not None:
+                return index, pushed
+        return -1, ()
+
+    def holds(self) -> bool:
+        """Whether every class searched is still exactly as it was"""
+        if self.renames != d_Class.renames:
+            return False
+        for class_, attrs, version in self.guards:
+            if class_.attrs is not attrs or attrs.version != version:
+                return False
+        for parents, list_ in self.parents:
+            if parents is not None and parents.list_ is not list_:
+                return False
+        return True
+
+    def repeat(self, inst: d_Inst) -> Optional[d_Thing]:
+        """Leave inst just as the search would have, once none of the probes
+        were found in it"""
+        inst.cur_prefix.extend(self.pushed)
+        if self.explicit:
+            inst.clear_prefix_to_class()
+            inst.add_parent_prefix(self.result)  # type: ignore
+            inst.add_class_sep()
+        return self.result
+
+
+# How many classes each dot remembers
+SITE_SIZE = 4
 
 
 class PrefixSeperator(Enum):
@@ -554,10 +1053,13 @@ class PrefixSeperator(Enum):
 
 
 class d_Inst(d_Container):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Inst"
         self.grammar = d_Grammar.VALUE_INST
+        self.attrs: InstAttrs = InstAttrs()  # type: ignore
         self.parent: d_Class = None  # type: ignore
 
         self.cur_prefix: List[prefix_item] = []
@@ -622,9 +1124,10 @@ class d_Inst(d_Container):
         self.clear_prefix_to_func()
 
     def compose_prefix(self, name: str) -> d_Variable:
-        var = d_Variable(name)
-        var.prefix = [c for c in self.cur_prefix if isinstance(c, d_Class)]
-        return var
+        prefix = tuple(c for c in self.cur_prefix if isinstance(c, d_Class))
+        if not prefix:
+            return scope_key(name)
+        return d_Variable(name, prefix)
 
 
 def _clear_prefix_to_sep(inst: d_Inst, seperators: List[PrefixSeperator]):
@@ -638,6 +1141,8 @@ def _clear_prefix_to_sep(inst: d_Inst, seperators: List[PrefixSeperator]):
 
 
 class d_Body(d_Container):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.path: str = None  # type: ignore
@@ -645,6 +1150,8 @@ class d_Body(d_Container):
         self.end_loc: CodeLocation = None  # type: ignore
         self.view: memoryview = None  # type: ignore
         self.parent_scope: d_Body = None  # type: ignore
+        # The lexed tokens of the view, only valid while the view is unchanged
+        self.token_cache: Optional[TokenCache] = None
 
     @classmethod
     def from_str(cls, name: str, code: str, mock_path: str) -> d_Body:
@@ -695,6 +1202,8 @@ def _type_to_obj(dec: Declarable) -> d_Thing:
 
 
 class d_Dit(d_Body):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Dit"
@@ -731,13 +1240,43 @@ class d_Dit(d_Body):
 
 
 class d_Class(d_Body):
+    __slots__ = ()
+    # Also the lineage of a Thing that became a class by assignment
+    lineage: Optional[Lineage] = None
+    # Every time any class was given a different name.
+    # Searches compare the names of parents, so none survive a rename.
+    renames: int = 0
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Class"
         self.grammar = d_Grammar.VALUE_CLASS
 
+    @property  # type: ignore
+    def name(self) -> str:
+        return THING_NAME.__get__(self)
+
+    @name.setter
+    def name(self, name: str) -> None:
+        # Kept in the same slot as any other thing's name, so a Thing that
+        # becomes a class still has the name it had before
+        try:
+            old = THING_NAME.__get__(self)
+        except AttributeError:
+            old = None  # d_Thing.__init__ hasn't set it yet
+        if old is not None and old != name:
+            d_Class.renames += 1
+        THING_NAME.__set__(self, name)
+
+    def get_lineage(self) -> Lineage:
+        """The parent graph of this class, flattened in search order.
+        It is listed again when the Parents of any class in it change."""
+        if self.lineage is None or not self.lineage.holds():
+            self.lineage = Lineage(self)
+        return self.lineage
+
     def get_parents(self) -> Optional[d_List]:
-        p = d_Variable(PARENTS)
+        p = scope_key(PARENTS)
         if p not in self.attrs:
             return None
         parents = self.attrs[p]
@@ -750,6 +1289,8 @@ class d_Class(d_Body):
 
 
 class d_Lang(d_Body):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Lang"
@@ -762,7 +1303,7 @@ class d_Lang(d_Body):
         # to the current lang 'Priority'
         # Every variable must keep track of the priority at the time it was declared.
         priority = 0
-        p = d_Variable(PRIORITY)
+        p = scope_key(PRIORITY)
 
         if p in self.attrs:
             item = self.attrs[p]
@@ -794,12 +1335,12 @@ class d_Lang(d_Body):
 def _combine_langs(lang1: d_Lang, lang2: d_Lang) -> Dict[d_Variable, Ref_Thing]:
     # First remove priority values
     # the priority has already been individually assigned to each variable
-    pri_var = d_Variable(PRIORITY)
+    pri_var = scope_key(PRIORITY)
     lang1.attrs.pop(pri_var, None)
     lang2.attrs.pop(pri_var, None)
     set1, set2 = set(lang1.attrs), set(lang2.attrs)
     # Start by pulling all the items that don't have the same names into a list
-    out: Dict[d_Variable, Ref_Thing] = {}
+    out: Dict[d_Variable, Ref_Thing] = AttrDict()
     for unique_var in set1.symmetric_difference(set2):
         if unique_var in lang1.attrs:
             out[unique_var] = lang1.attrs[unique_var]
@@ -814,6 +1355,8 @@ def _combine_langs(lang1: d_Lang, lang2: d_Lang) -> Dict[d_Variable, Ref_Thing]:
 
 
 class d_Func(d_Body):
+    __slots__ = ()
+
     def __init__(self) -> None:
         super().__init__()
         self.public_type = "Function"
@@ -827,8 +1370,11 @@ class d_Func(d_Body):
         self.return_: d_Type = None  # type: ignore
         self.return_list: bool = None  # type: ignore
         self.parameters: List[Declarable] = []
+        self.binder: Optional[ParamBinder] = None
         self.code: bytearray = None  # type: ignore
         self.guest_func_path: str = None  # type: ignore
+        # The exe_ditlang code run most recently, so it's only lexed once
+        self.mock_caches: OrderedDict[str, TokenCache] = OrderedDict()
 
     def pub_name(self) -> str:
         return f"{self.name}()" if self.name else "<anonymous function>()"
@@ -841,7 +1387,7 @@ class d_Func(d_Body):
             self.attr_stack.append(self.attrs)
         else:
             # This is a recursive call, we need a new attr on the stack
-            self.attr_stack.append({})
+            self.attr_stack.append(AttrDict())
             self.attrs = self.attr_stack[-1]
 
     def end_call(self) -> None:
@@ -856,8 +1402,20 @@ class d_Func(d_Body):
             self.attr_stack.pop()
             self.attrs = self.attr_stack[-1]
 
+    def bind_args(self, args: List[ArgumentLocation]) -> None:
+        """Check each argument against its parameter, and add it to this call"""
+        if self.binder is None:
+            # Every parameter is declared before the function can be called
+            self.binder = ParamBinder(self.parameters)
+        self.binder.bind(self, args)
+
     def get_mock(self, code: str) -> d_Func:
         mock_func: d_Func = d_Func.from_str("mock_exe_ditlang", code, self.guest_func_path)  # type: ignore
+        cache = self.mock_caches.get(code)
+        if cache is not None:
+            self.mock_caches.move_to_end(code)
+            mock_func.token_cache = cache
+            mock_func.view = cache.view
         mock_func.attrs = self.attrs
         mock_func.parent_scope = self.parent_scope
         mock_func.start_loc = CodeLocation(0, 1, 1)
@@ -865,6 +1423,17 @@ class d_Func(d_Body):
         mock_func.return_list = self.return_list
         return mock_func
 
+    def keep_mock(self, code: str, cache: TokenCache) -> None:
+        self.mock_caches[code] = cache
+        self.mock_caches.move_to_end(code)
+        if len(self.mock_caches) > MOCK_CACHE_SIZE:
+            self.mock_caches.popitem(last=False)
+
+
+# How much exe_ditlang code each function keeps lexed. Circle expressions put
+# guest values into the code, so most of it is never run again, and code
+# that is, like the body of a guest loop, is run again straight away.
+MOCK_CACHE_SIZE = 16
 
 d_Type = Union[d_Grammar, d_Class]
 prefix_item = Union[d_Class, PrefixSeperator]
@@ -946,6 +1515,88 @@ def check_value(thing: d_Thing, dec: Declarable) -> Optional[CheckResult]:
         return CheckResult(exp, act, extra)
 
 
+class ParamBinder:
+    """Binds arguments to a function's parameters.
+    Built once per function, with the check each parameter needs already chosen,
+    so a call doesn't have to work out again what its parameters accept."""
+
+    __slots__ = ("count", "params")
+
+    def __init__(self, parameters: List[Declarable]) -> None:
+        self.count = len(parameters)
+        self.params: List[Tuple[Declarable, d_Variable, Optional[Checker]]] = [
+            (param, scope_key(param.name), _param_checker(param))
+            for param in parameters
+        ]
+
+    def bind(self, func: d_Func, args: List[ArgumentLocation]) -> None:
+        attrs = func.attrs
+        for (param, key, checker), arg in zip(self.params, args):
+            thing = arg.thing
+            if checker is not None:
+                res = checker(thing)
+                if res:
+                    o = (
+                        f"{func.pub_name()} expected '{res.expected}', "
+                        f"got '{res.actual}'{res.extra}"
+                    )
+                    raise d_TypeMismatchError(o, arg.loc)
+                if param.listof:
+                    # The first check gives a list with no type yet the type of
+                    # the param, which a second check can still reject
+                    # listOf Thing l = [1, 2];
+                    # func f(listOf Num x) {||}
+                    res = check_value(thing, param)
+                    if res:
+                        raise d_TypeMismatchError(
+                            f"Cannot assign {res.actual} to {res.expected}{res.extra}"
+                        )
+            else:
+                thing.can_be_anything = True
+            if key in attrs:
+                mes = f"A duplicate attribute was found: '{param.name}'"
+                raise d_CriticalError(mes)
+            # Use a ref to hide the original name without changing it
+            attrs[key] = d_Ref(param.name, thing)
+
+        if len(args) < self.count:
+            miss = self.count - len(args)
+            raise d_SyntaxError(f"{func.pub_name()} missing {miss} required arguments")
+        elif len(args) > self.count:
+            # TODO: implement proper k-args functionality
+            miss = len(args) - self.count
+            raise d_SyntaxError(f"{func.pub_name()} given {miss} too many arguments")
+
+
+Checker = Callable[[d_Thing], Optional[CheckResult]]
+
+
+def _param_checker(param: Declarable) -> Optional[Checker]:
+    """The check for arguments of a parameter, or None for Thing, which takes any.
+    Arguments that plainly match pass without calling check_value,
+    anything else gets the full check."""
+    type_ = param.type_
+    if type_ == d_Grammar.PRIMITIVE_THING:
+        # Thing test = ...;
+        # listOf Thing test = ...;
+        return None
+    elif param.listof:
+        return lambda thing: check_value(thing, param)
+    elif isinstance(type_, d_Class):
+        # Person per = Person();
+        return lambda thing: (
+            None
+            if isinstance(thing, d_Inst) and thing.parent is type_
+            else check_value(thing, param)
+        )
+    else:
+        # Str test = 'cat';
+        grammar = prim_to_value(type_)
+        return lambda thing: (
+            None if thing.grammar is grammar else check_value(thing, param)
+        )
+
+
 def _get_check_result(thing: d_Thing, dec: Declarable) -> CheckResult:
     return CheckResult(expected=_dec_to_str(dec), actual=_thing_to_str(thing))
 
@@ -956,9 +1607,17 @@ def _is_subclass(inst: d_Thing, class_: d_Class) -> bool:
     if inst.parent is class_:
         return True
 
-    # I'm not sure there are any cases where cur_prefix would be assigned,
-    # but just in case, I'm saving and reassigning it.
-    stored_prefix = copy.deepcopy(inst.cur_prefix)
+    # An inst is of any class that searching it for the class's name finds.
+    # Searching for it again repeats the last search, which lasts until
+    # a class it went through, or their Parents, change.
+    lookup = _cached_lookup(inst.compose_prefix(class_.name), inst.parent, None)
+    if lookup is not None and lookup.complete and lookup.holds():
+        if lookup.result is not None:
+            return True
+        return any(key in inst.attrs for key, _ in lookup.probes)
+
+    # Searching pushes parents onto cur_prefix, which has to be undone
+    stored_prefix = inst.cur_prefix[:]
     res = inst.find_attr(class_.name)
     inst.cur_prefix = stored_prefix
     return bool(res)
@@ -1007,26 +1666,52 @@ class ThrowController(FlowControlException):
         super().__init__(token)
 
 
-@dataclass
+@dataclass(init=False)
 class Token:
     """A single bit of meaning taken from dit code.
-    loc must be copy.deepcopy from the char_feed before this is created
+    loc is shared between every replay of the token, and must not be changed
     word will contain the name of NEW_NAME grammars.
     obj will contain the d_Thing of VALUE_x grammars."""
 
+    # There's one for every token, so it has slots. Fields with defaults
+    # would clash with those slots, so the defaults are in __init__ instead.
+    __slots__ = ("grammar", "loc", "word", "thing")
     grammar: d_Grammar
     loc: CodeLocation
-    word: str = None  # type: ignore
-    thing: d_Thing = None  # type: ignore
+    word: str
+    thing: d_Thing
 
+    def __init__(
+        self,
+        grammar: d_Grammar,
+        loc: CodeLocation,
+        word: str = None,  # type: ignore
+        thing: d_Thing = None,  # type: ignore
+    ) -> None:
+        self.grammar = grammar
+        self.loc = loc
+        self.word = word
+        self.thing = thing
 
-@dataclass
+
+@dataclass(init=False)
 class Declarable:
     """All the information required to declare a new variable."""
 
-    type_: d_Type = None  # type: ignore
-    name: str = None  # type: ignore
-    listof: bool = False  # type: ignore
+    __slots__ = ("type_", "name", "listof")
+    type_: d_Type
+    name: str
+    listof: bool
+
+    def __init__(
+        self,
+        type_: d_Type = None,  # type: ignore
+        name: str = None,  # type: ignore
+        listof: bool = False,
+    ) -> None:
+        self.type_ = type_
+        self.name = name
+        self.listof = listof
 
     def reset(self):
         self.type_ = None  # type: ignore
@@ -1038,12 +1723,14 @@ class Declarable:
 class ArgumentLocation:
     """An argument and the location where it was found"""
 
+    __slots__ = ("loc", "thing")
     loc: CodeLocation
     thing: d_Thing
 
 
-import json
-from enum import Enum
+# Each message to and from a guest is its length, then that many bytes of JSON
+FRAME_HEADER = struct.Struct(">I")
+JOB_IDS = count(1)
 
 
 class JobType(Enum):
@@ -1066,17 +1753,26 @@ class GuestDaemonJob:
     result: Union[str, list] = None  # type: ignore
     crash: BaseException = None  # type: ignore
     active: bool = False
-
-    def get_json(self) -> bytes:
-        py_json: Dict[str, Union[str, list]] = {
+    # Set by the daemon thread once the guest has answered
+    done: Event = field(default_factory=Event)
+    # Sent with every message for this call, and sent back in every reply
+    id_: int = field(default_factory=lambda: next(JOB_IDS))
+
+    def get_json(self, framed: bool = True) -> bytes:
+        """The job as one message for its guest. Guests that connected without
+        framing get the old newline-terminated JSON instead."""
+        py_json: Dict[str, Union[str, int, list]] = {
             "type": self.type_.value,
+            "id": self.id_,
             "lang_name": self.func.lang.name,
             "func_name": self.func.name,
             "func_path": self.func.guest_func_path,
             "result": self.result,
         }
-        temp = json.dumps(py_json) + "\n"
-        return temp.encode()
+        if not framed:
+            return (json.dumps(py_json) + "\n").encode()
+        payload = json.dumps(py_json).encode()
+        return FRAME_HEADER.pack(len(payload)) + payload
 
 
 OBJECT_DISPATCH = {
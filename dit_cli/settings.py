@@ -1,18 +1,133 @@
 """Misc global configuration options"""
 
-from dataclasses import dataclass
-from typing import Optional, TextIO
+import os
+import re
+from bisect import bisect_left, bisect_right
+from typing import List, Optional, TextIO, Tuple
 
 DIT_FILEPATH: str = None  # type: ignore
 TEST_OUTPUT: Optional[TextIO] = None
+# Where lexed dit files are kept between runs, None to never cache
+CACHE_DIR: Optional[str] = None
+DEFAULT_CACHE_DIR: str = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "dit"
+)
+
+
+class LineIndex:
+    """Where every newline is in a body of code, so the line and col of any pos
+    can be found with bisect, only when something actually needs them.
+    Nested bodies share the newlines of the code they were sliced from,
+    and only know the pos where they start in their parent. That way,
+    an edit only has to move the bodies directly inside the edited one."""
+
+    def __init__(
+        self,
+        newlines: List[int],
+        col: int,
+        line: int,
+        parent: Optional["LineIndex"] = None,
+        start: int = 0,
+    ) -> None:
+        self.newlines: List[int] = newlines
+        self.col: int = col  # col and line at pos 0 of the outermost code
+        self.line: int = line
+        self.parent: Optional[LineIndex] = parent
+        self.start: int = start  # pos in the parent where this starts
+
+    @classmethod
+    def from_code(cls, code: bytes, col: int, line: int) -> "LineIndex":
+        # Nothing is ever stepped onto pos 0, so a newline there doesn't count
+        return cls([m.start() for m in NEWLINE.finditer(code, 1)], col, line)
+
+    @property
+    def offset(self) -> int:
+        """pos in the outermost code where this starts"""
+        if self.parent is None:
+            return self.start
+        return self.parent.offset + self.start
+
+    def nested(self, pos: int) -> "LineIndex":
+        """The index for a slice of this code, starting at pos"""
+        return LineIndex(self.newlines, self.col, self.line, self, pos)
+
+    def locate(self, pos: int) -> Tuple[int, int]:
+        """Returns the (col, line) of pos"""
+        pos += self.offset
+        count = bisect_right(self.newlines, pos)
+        if count == 0:
+            return self.col + pos, self.line
+        return pos - self.newlines[count - 1], self.line + count
+
+    def edit(self, code: bytes, offset: int, removed: int, added: int) -> None:
+        """Update the outermost index in place, after removed bytes at offset
+        were replaced by added bytes, giving code."""
+        newlines = self.newlines
+        low = bisect_left(newlines, offset)
+        high = bisect_left(newlines, offset + removed)
+        delta = added - removed
+        end = offset + added
+        if offset == 0 and removed == 0:
+            end += 1  # the uncounted newline at pos 0 might have been moved
+        inserted = [m.start() for m in NEWLINE.finditer(code, offset, end)]
+        newlines[low:] = inserted + [pos + delta for pos in newlines[high:]]
+        if newlines and newlines[0] == 0:
+            del newlines[0]
+
+
+NEWLINE = re.compile(b"\n")
 
 
-@dataclass
 class CodeLocation:
     """Represents a position in a memoryview of code
     view[pos] will always be the current char
-    line is incremented at every \n and col is reset to 0"""
+    line is incremented at every \\n and col is reset to 0
+    Locations made by the lexer only have a pos and the LineIndex of their body.
+    col and line are worked out whenever they are read, which is only ever
+    for errors, so that moving the pos of a location is all an edit needs."""
+
+    __slots__ = ("pos", "_col", "_line", "lines")
+
+    def __init__(
+        self,
+        pos: int,
+        col: Optional[int] = None,
+        line: Optional[int] = None,
+        lines: Optional[LineIndex] = None,
+    ) -> None:
+        self.pos: int = pos
+        self._col: Optional[int] = col
+        self._line: Optional[int] = line
+        self.lines: Optional[LineIndex] = lines
+
+    @property
+    def col(self) -> int:
+        if self._col is None:
+            return self.lines.locate(self.pos)[0]  # type: ignore
+        return self._col
+
+    @col.setter
+    def col(self, value: int) -> None:
+        self._col = value
+
+    @property
+    def line(self) -> int:
+        if self._line is None:
+            return self.lines.locate(self.pos)[1]  # type: ignore
+        return self._line
+
+    @line.setter
+    def line(self, value: int) -> None:
+        self._line = value
+
+    def __deepcopy__(self, memo: dict) -> "CodeLocation":
+        # The LineIndex is shared, never copied
+        return CodeLocation(self.pos, self._col, self._line, self.lines)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, CodeLocation):
+            return NotImplemented
+        return (self.pos, self.col, self.line) == (other.pos, other.col, other.line)
 
-    pos: int
-    col: int
-    line: int
+    def __repr__(self) -> str:
+        return f"CodeLocation(pos={self.pos}, col={self.col}, line={self.line})"
@@ -0,0 +1,113 @@
+import os
+import sys
+
+import pytest
+
+import dit_cli.settings
+from dit_cli import disk_cache, interpret_context
+from dit_cli.cli import main, run_string
+
+CODE = "Str a = 'cat';\nfunc f() {|\n    print(a);\n|}\nf();\nprint([1, 2]);"
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(dit_cli.settings, "CACHE_DIR", str(cache_dir))
+    monkeypatch.setattr(interpret_context, "DIT_CACHES", {})
+    return cache_dir
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """What every disk_cache.load returned"""
+    results = []
+    load = disk_cache.load
+
+    def spy(source, code):
+        results.append(load(source, code))
+        return results[-1]
+
+    monkeypatch.setattr(disk_cache, "load", spy)
+    return results
+
+
+def _run(code: str, path: str, capfd) -> str:
+    # A new process would only have what's on disk
+    interpret_context.DIT_CACHES.clear()
+    run_string(code, path)
+    return capfd.readouterr()[0]
+
+
+def test_cache_hit(cache_dir, loads, tmp_path, capfd):
+    path = str(tmp_path / "main.dit")
+    first = _run(CODE, path, capfd)
+    assert first == "cat\n[1, 2]\n"
+    assert len(os.listdir(cache_dir)) == 1
+    assert _run(CODE, path, capfd) == first
+    assert loads[0] is None and loads[1] is not None
+
+
+def test_stale_cache(cache_dir, loads, tmp_path, capfd):
+    path = str(tmp_path / "main.dit")
+    _run(CODE, path, capfd)
+    changed = CODE.replace("cat", "dog")
+    assert _run(changed, path, capfd) == "dog\n[1, 2]\n"
+    assert loads[1] is None
+    # The cache now holds the changed code
+    assert _run(changed, path, capfd) == "dog\n[1, 2]\n"
+    assert loads[2] is not None
+
+
+def test_new_cache_format(cache_dir, loads, tmp_path, capfd, monkeypatch):
+    path = str(tmp_path / "main.dit")
+    expected = _run(CODE, path, capfd)
+    monkeypatch.setattr(disk_cache, "FORMAT", disk_cache.FORMAT + 1)
+    assert _run(CODE, path, capfd) == expected
+    assert loads[1] is None
+
+
+@pytest.mark.parametrize("damage", ["truncated", "garbage", "empty"])
+def test_corrupt_cache(cache_dir, loads, tmp_path, capfd, damage):
+    path = str(tmp_path / "main.dit")
+    expected = _run(CODE, path, capfd)
+    (cache_file,) = cache_dir.iterdir()
+    data = cache_file.read_bytes()
+    if damage == "truncated":
+        cache_file.write_bytes(data[: len(data) // 2])
+    elif damage == "garbage":
+        cache_file.write_bytes(b"not a pickle" + data[12:])
+    else:
+        cache_file.write_bytes(b"")
+    assert _run(CODE, path, capfd) == expected
+    assert loads[1] is None
+    # Lexing again replaced the damaged file
+    assert _run(CODE, path, capfd) == expected
+    assert loads[2] is not None
+
+
+def test_no_cache_flag(tmp_path, monkeypatch, capfd):
+    default = tmp_path / "default"
+    monkeypatch.setattr(dit_cli.settings, "DEFAULT_CACHE_DIR", str(default))
+    monkeypatch.setattr(dit_cli.settings, "CACHE_DIR", None)
+    monkeypatch.setattr(interpret_context, "DIT_CACHES", {})
+    paths = []
+    cache_path = disk_cache._cache_path
+
+    def spy(source):
+        paths.append(source)
+        return cache_path(source)
+
+    monkeypatch.setattr(disk_cache, "_cache_path", spy)
+    dit = tmp_path / "main.dit"
+    dit.write_text(CODE)
+    monkeypatch.setattr(sys, "argv", ["dit", "--no-cache", str(dit)])
+    main()
+    assert capfd.readouterr()[0] == "cat\n[1, 2]\n"
+    assert paths == [] and not default.exists()
+    # Without the flag, the same run reads and writes the default cache
+    interpret_context.DIT_CACHES.clear()
+    monkeypatch.setattr(sys, "argv", ["dit", str(dit)])
+    main()
+    assert capfd.readouterr()[0] == "cat\n[1, 2]\n"
+    assert paths and len(os.listdir(default)) == 1
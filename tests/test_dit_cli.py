@@ -1,10 +1,12 @@
 import json
 import os
+import sys
 
 import pytest
 from _pytest.python import Metafunc
 
-from dit_cli.cli import run_string
+from dit_cli.checker import check_string
+from dit_cli.cli import main, run_string
 from dit_cli.lang_daemon import start_daemon
 
 os.environ["NO_COLOR"] = "1"
@@ -48,3 +50,77 @@ def test_dits(dit_json, capfd):
         else:
             assert output == dit_json["expected"] + "\n"
 
+
+def test_check(dit_json):
+    # Anything that runs must also pass a check
+    if dit_json["type"] == "succeed":
+        assert check_string(dit_json["dit"], "tests/fail.dit") is None
+
+
+SYNTAX_ERRORS = {
+    "unclosed bar brace": "func f() {|\n    print('a');\n",
+    "unclosed string": "Str s = 'abc;\nprint(s);",
+    "unclosed string in a class": 'class A {|\n    Str s = "x\n|}',
+    "sign without a digit": "Num n = -x;",
+}
+
+
+@pytest.mark.parametrize("code", SYNTAX_ERRORS.values(), ids=SYNTAX_ERRORS.keys())
+def test_check_matches_run(code, capfd):
+    run_string(code, "tests/fail.dit")
+    output, err = capfd.readouterr()
+    assert check_string(code, "tests/fail.dit") + "\n" == output
+
+
+@pytest.fixture
+def check_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "good.dit").write_text("Str value = 'fine';")
+    (tmp_path / "broken.dit").write_text("Str s = 'open;\n")
+    (tmp_path / "main.dit").write_text("import 'broken.dit';\nprint('ok');")
+    (tmp_path / "lost.dit").write_text("print('ok');\nimport 'missing.dit';")
+    (tmp_path / "nested.dit").write_text("import 'lost.dit';")
+    return tmp_path
+
+
+def _check_cli(monkeypatch, *args: str) -> int:
+    monkeypatch.setattr(sys, "argv", ["dit", "--check", *args])
+    with pytest.raises(SystemExit) as exit_info:
+        main()
+    return exit_info.value.code  # type: ignore
+
+
+def test_check_exit_status(check_dir, monkeypatch, capfd):
+    assert _check_cli(monkeypatch, "good.dit") == 0
+    assert capfd.readouterr()[0] == ""
+    assert _check_cli(monkeypatch, "good.dit", "broken.dit") == 1
+    assert capfd.readouterr()[0].startswith("Line: 1 Col: 14 (broken.dit)")
+
+
+def test_check_follow_imports(check_dir, monkeypatch, capfd):
+    assert _check_cli(monkeypatch, "main.dit") == 0
+    assert capfd.readouterr()[0] == ""
+    assert _check_cli(monkeypatch, "--follow-imports", "main.dit") == 1
+    output, err = capfd.readouterr()
+    # The same trace as running it
+    run_string((check_dir / "main.dit").read_text(), "main.dit")
+    assert output == capfd.readouterr()[0]
+
+
+def test_check_jobs(check_dir, monkeypatch, capfd):
+    paths = ["good.dit", "broken.dit", "main.dit", "broken.dit"]
+    assert _check_cli(monkeypatch, "-j", "1", *paths) == 1
+    serial, err = capfd.readouterr()
+    assert serial.count("SyntaxError") == 2
+    assert _check_cli(monkeypatch, "-j", "2", *paths) == 1
+    assert capfd.readouterr()[0] == serial
+
+
+@pytest.mark.parametrize("path", ["lost.dit", "nested.dit"])
+def test_check_missing_import(check_dir, monkeypatch, capfd, path):
+    assert _check_cli(monkeypatch, path) == 0
+    assert _check_cli(monkeypatch, "--follow-imports", path) == 1
+    output, err = capfd.readouterr()
+    run_string((check_dir / path).read_text(), path)
+    # Only the run prints ok, before it gets to the import
+    assert output == capfd.readouterr()[0].replace("ok\n", "", 1)
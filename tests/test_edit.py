@@ -0,0 +1,131 @@
+import pytest
+
+from dit_cli import interpret_context
+from dit_cli.cli import run_string
+from dit_cli.interpret_context import edit_dit
+
+PATH = "tests/edit.dit"
+CODE = (
+    "Str a = 'cat';\n"
+    "func f(Str s) {|\n"
+    "    Str t = 'in f';\n"
+    "    print(s);\n"
+    "    print(t);\n"
+    "|}\n"
+    "// a comment {| with a brace\n"
+    "func g() {|\n"
+    "    /* block |} comment */\n"
+    "    print('g {| not a body');\n"
+    "|}\n"
+    "class A {|\n"
+    "    Str x = 'ax';\n"
+    "    func show(Str s) {|\n"
+    "        print(s);\n"
+    "    |}\n"
+    "    show(x);\n"
+    "|}\n"
+    "f(a);\n"
+    "g();\n"
+    "A.show('again');\n"
+    "print([1, -2.5, 3]);"
+)
+# Each edit replaces the first match of its old text with its new text
+EDITS = {
+    "in a body": [("'in f'", "'edited'")],
+    "line added to a body": [("    print(t);\n", "    print(t);\n    print(a);\n")],
+    "in a nested body": [("        print(s);\n", "        print(x);\n")],
+    "between bodies": [("f(a);\n", "Str b = 'dog';\nf(b);\n")],
+    "before every body": [("Str a = 'cat';", "Str a = 'cow';")],
+    "at the very end": [("3]);", "3]);\nprint(a);")],
+    "across two bodies": [
+        ("print(t);\n|}\n// a comment {| with a brace\nfunc g() {|\n", "|}\n"),
+        ("g();\n", ""),
+    ],
+    "quote opened": [("Str a = 'cat';", "Str a = 'cat;")],
+    "quote opened and closed again": [
+        ("Str a = 'cat';", "Str a = 'cat;"),
+        ("Str a = 'cat;", "Str a = 'cat';"),
+    ],
+    "quote removed from around a {|": [("print('g {|", "print(g {|")],
+    "quote added before a {|": [("func g() {|", "func g() '{|")],
+    "body added": [("g();\n", "func h() {|\n    print('h');\n|}\nh();\ng();\n")],
+    "{| removed": [("func f(Str s) {|", "func f(Str s)")],
+    "|} removed and put back": [
+        ("    print(t);\n|}", "    print(t);\n"),
+        ("    print(t);\n", "    print(t);\n|}"),
+    ],
+    "line commented out": [("f(a);\n", "// f(a);\n")],
+    "// removed from a {|": [("// a comment", "   a comment")],
+    "// added before a {|": [("func g() {|", "// func g() {|")],
+    "/* */ left open": [("/* block |} comment */", "/* block |} comment")],
+    "/* */ around a line": [
+        ("    print('g {| not a body');\n", "    /* print('g {| not a body'); */\n")
+    ],
+    "/* */ closed early": [("/* block |} comment */", "/* block */ |} comment */")],
+    "error after an edited body": [
+        ("'in f'", "'edited, and longer'"),
+        ("A.show('again');", "A.show(again);"),
+    ],
+    "error after a body with an added line": [
+        ("    print(t);\n", "    print(t);\n    print(a);\n"),
+        ("print([1, -2.5, 3]);", "print([1, -2.5, 3])"),
+    ],
+    "several, in order": [
+        ("'in f'", "'edited'"),
+        ("f(a);\n", "f(a);\nf('b');\n"),
+        ("'ax'", "'bx'"),
+        ("print([1,", "print([0, 1,"),
+    ],
+}
+
+
+def _fresh_run(code: str, capfd) -> str:
+    # Run the code as if it was never run before, keeping the cache aside
+    saved = interpret_context.DIT_CACHES.pop(PATH)
+    run_string(code, PATH)
+    interpret_context.DIT_CACHES[PATH] = saved
+    return capfd.readouterr()[0]
+
+
+@pytest.fixture(autouse=True)
+def dit_caches(monkeypatch):
+    monkeypatch.setattr(interpret_context, "DIT_CACHES", {})
+
+
+@pytest.mark.parametrize("edits", EDITS.values(), ids=EDITS.keys())
+def test_edit_matches_fresh_run(edits, capfd):
+    code = CODE
+    run_string(code, PATH)
+    capfd.readouterr()
+    for old, new in edits:
+        assert old in code
+        offset = code.index(old)
+        expected = code[:offset] + new + code[offset + len(old) :]
+        code = edit_dit(PATH, offset, len(old), new)
+        assert code == expected
+        run_string(code, PATH)
+        edited = capfd.readouterr()[0]
+        assert edited == _fresh_run(code, capfd)
+        # Running again replays the same cache
+        run_string(code, PATH)
+        assert capfd.readouterr()[0] == edited
+
+
+def test_edit_before_lexing_finished(capfd):
+    # The first run stops at the error, so most of the code was never lexed
+    code = CODE.replace("f(a);", "f(a)")
+    run_string(code, PATH)
+    assert "SyntaxError" in capfd.readouterr()[0]
+    offset = code.index("f(a)") + 4
+    code = edit_dit(PATH, offset, 0, ";")
+    assert code == CODE
+    run_string(code, PATH)
+    assert capfd.readouterr()[0] == _fresh_run(code, capfd)
+
+
+def test_edit_outside_the_code():
+    run_string(CODE, PATH)
+    with pytest.raises(ValueError):
+        edit_dit(PATH, len(CODE), 1, "")
+    with pytest.raises(ValueError):
+        edit_dit("tests/never_run.dit", 0, 0, "")
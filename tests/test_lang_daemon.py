@@ -0,0 +1,193 @@
+import json
+import socket
+import time
+from threading import Thread
+from typing import List
+
+from dit_cli import guest_codec, lang_daemon
+from dit_cli.interpreter import interpret
+from dit_cli.oop import (
+    FRAME_HEADER,
+    MOCK_CACHE_SIZE,
+    GuestDaemonJob,
+    JobType,
+    d_Dit,
+    d_Func,
+    d_Lang,
+)
+
+GUESTS = 4
+
+
+def _run_guests(count: int, body: str = "    pass") -> List[d_Func]:
+    """Start count Python guests, each with one function finished,
+    and leave them connected to the daemon."""
+    code = "pull Python from 'langs/python.dit';\n"
+    for num in range(count):
+        code += (
+            f"lang Py{num} {{||}}\nPy{num} = Python;\n"
+            f"sig Py{num} func ready{num}() {{|\n{body}\n|}}\nready{num}();\n"
+        )
+    dit = d_Dit.from_str("Main", code, "tests/fail.dit")
+    dit.finalize()
+    interpret(dit)
+    return [dit.find_attr(f"ready{num}") for num in range(count)]  # type: ignore
+
+
+def test_idle_daemon_uses_no_cpu():
+    lang_daemon.start_daemon()
+    try:
+        _run_guests(GUESTS)
+        assert len(lang_daemon.CLIENTS) == GUESTS
+        start = time.process_time()
+        time.sleep(0.5)
+        # The daemon thread is the only thing in this process that could run
+        assert time.process_time() - start < 0.01
+    finally:
+        lang_daemon.kill_all()
+
+
+def test_guests_that_close_while_connecting():
+    lang_daemon.start_daemon()
+    try:
+        lang_daemon.LISTENING.wait()
+        for sent in [b"", b"\0\0", FRAME_HEADER.pack(100) + b"{"]:
+            with socket.create_connection(("127.0.0.1", lang_daemon.PORT)) as conn:
+                conn.sendall(sent)
+        lang_daemon.DAEMON.join(0.2)  # type: ignore
+        assert lang_daemon.DAEMON.is_alive()  # type: ignore
+        # And still answers a guest that does connect
+        _run_guests(1)
+    finally:
+        lang_daemon.kill_all()
+
+
+def test_calls_to_different_guests_overlap():
+    # The first call, which starts each guest, returns straight away
+    body = (
+        "    import time\n"
+        "    time.sleep(0.5 if getattr(time, 'dit_called', False) else 0)\n"
+        "    time.dit_called = True"
+    )
+    lang_daemon.start_daemon()
+    try:
+        funcs = _run_guests(2, body)
+        jobs = [GuestDaemonJob(JobType.CALL_FUNC, func) for func in funcs]
+        threads = [Thread(target=lang_daemon.run_job, args=(job,)) for job in jobs]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.perf_counter() - start < 0.9
+        assert [job.type_ for job in jobs] == [JobType.FINISH_FUNC] * 2
+    finally:
+        lang_daemon.kill_all()
+
+
+def test_replies_go_to_the_job_they_name():
+    client = lang_daemon.d_Client(d_Lang(), None)  # type: ignore
+    outer = GuestDaemonJob(JobType.CALL_FUNC, d_Func())
+    inner = GuestDaemonJob(JobType.CALL_FUNC, d_Func())
+    client.jobs = {outer.id_: outer, inner.id_: inner}
+    client.last_sent = inner.id_
+    callback = {"type": "exe_ditlang", "id": outer.id_, "result": "x;"}
+    lang_daemon._handle_message(client, callback)
+    assert outer.type_ == JobType.EXE_DITLANG and outer.done.is_set()
+    assert inner.type_ == JobType.CALL_FUNC and not inner.done.is_set()
+    assert outer.id_ in client.jobs
+    # A guest that sends no ids is answering the job it was sent last
+    lang_daemon._handle_message(client, {"type": "finish_func"})
+    assert inner.type_ == JobType.FINISH_FUNC and inner.done.is_set()
+    assert list(client.jobs) == [outer.id_]
+
+
+def test_ditlang_code_cache_stays_small(capfd):
+    # Every callback has different code, since it holds the value of i
+    body = (
+        "    for i in range(200):\n"
+        "        <|print((|i|))|>\n"
+        "        <|print('same')|>"
+    )
+    lang_daemon.start_daemon()
+    try:
+        (func,) = _run_guests(1, body)
+    finally:
+        lang_daemon.kill_all()
+    output = capfd.readouterr()[0].split()
+    assert output == [word for i in range(200) for word in (str(i), "same")]
+    assert len(func.mock_caches) == MOCK_CACHE_SIZE
+    # Code that is run over and over is never the one dropped
+    assert any(code.startswith("print('same')") for code in func.mock_caches)
+
+
+def test_frames_split_across_reads():
+    first = json.dumps({"type": "exe_ditlang", "result": "x" * 100_000}).encode()
+    second = json.dumps({"type": "finish_func"}).encode()
+    stream = b"".join(FRAME_HEADER.pack(len(raw)) + raw for raw in (first, second))
+    inbox = bytearray()
+    messages = []
+    for start in range(0, len(stream), 7_000):
+        inbox += stream[start : start + 7_000]
+        messages += lang_daemon._read_frames(inbox)
+    assert [message["type"] for message in messages] == ["exe_ditlang", "finish_func"]
+    assert len(messages[0]["result"]) == 100_000
+    assert inbox == bytearray()
+
+
+def test_bare_json_split_across_reads():
+    stream = '{"type": "exe_ditlang", "result": "café"}{"type": "finish_func"}'
+    raw = stream.encode()
+    inbox = bytearray()
+    messages = []
+    for start in range(len(raw)):
+        inbox += raw[start : start + 1]
+        messages += lang_daemon._read_bare_json(inbox)
+    assert messages == [
+        {"type": "exe_ditlang", "result": "café"},
+        {"type": "finish_func"},
+    ]
+    assert inbox == bytearray()
+
+
+def test_binary_values_round_trip():
+    values = [
+        None,
+        True,
+        -(1 << 63),
+        2.5,
+        "café",
+        [],
+        [1, 2, -3],
+        [0.5, 1e300],
+        ["a", "", "ünï"],
+        ["mixed", 1, False, [None]],
+        {"key": {"nested": [1.5, "x"]}, "": 0},
+        1 << 70,
+        -(1 << 63) - 1,
+        [1, 1 << 64],
+    ]
+    for value in values:
+        out = bytearray()
+        guest_codec.encode_value(value, out)
+        decoded, end = guest_codec.decode_value(memoryview(bytes(out)), 0)
+        assert end == len(out)
+        assert decoded == value
+        assert type(decoded) is type(value)
+    # String sizes are 4 bytes big-endian, whatever the platform's C ints are
+    out = bytearray()
+    guest_codec.encode_value(["ab", "c"], out)
+    assert bytes(out) == b"S\0\0\0\x02\0\0\0\x02\0\0\0\x01abc"
+
+
+def test_binary_job_names_function_once():
+    func = d_Func()
+    func.name = "guestFunc"
+    func.guest_func_path = "/tmp/dit/Python_func_Main_guestFunc.py"
+    client = lang_daemon.d_Client(d_Lang(), None)  # type: ignore
+    job = GuestDaemonJob(JobType.CALL_FUNC, func, result=[1, 2])
+    first = lang_daemon._binary_job(client, job)
+    second = lang_daemon._binary_job(client, job)
+    assert func.guest_func_path.encode() in first
+    assert func.guest_func_path.encode() not in second
+    assert len(second) < len(first)
@@ -0,0 +1,73 @@
+import pickle
+
+import pytest
+
+from dit_cli.interpreter import interpret
+from dit_cli.oop import (
+    ArgumentLocation,
+    Declarable,
+    Token,
+    d_Dit,
+    d_Grammar,
+    d_Variable,
+    scope_key,
+)
+from dit_cli.settings import CodeLocation
+
+
+def _run(code: str) -> d_Dit:
+    dit = d_Dit.from_str("Main", code, "tests/fail.dit")
+    dit.finalize()
+    interpret(dit)
+    return dit
+
+
+def test_plain_things_keep_nothing_outside_slots():
+    dit = _run("Num n = 3;\nStr s = 'a';\nBool b = true;\nThing t = 4;\nThing x;")
+    for name in ("n", "s", "b", "t", "x"):
+        # Reading __dict__ only makes an empty one, if nothing was put in it
+        assert vars(dit.find_attr(name)) == {}
+    # A list has more than the shared slots, which is what its __dict__ is for
+    assert vars(_run("listOf Num l = [1];").find_attr("l"))
+
+
+def test_records_have_no_dict():
+    loc = CodeLocation(0, 0, 1)
+    records = [
+        Token(d_Grammar.WORD, loc, "a"),
+        Declarable(name="a"),
+        ArgumentLocation(loc, None),  # type: ignore
+    ]
+    for record in records:
+        assert not hasattr(record, "__dict__")
+
+
+def test_records_compare_by_value():
+    word = Token(d_Grammar.WORD, CodeLocation(0, 0, 1), "a")
+    assert word == Token(d_Grammar.WORD, CodeLocation(0, 0, 1), "a")
+    assert word != Token(d_Grammar.WORD, CodeLocation(0, 0, 1), "b")
+    assert Declarable(name="a") == Declarable(None, "a", False)  # type: ignore
+    assert repr(Declarable(name="a")) == "Declarable(type_=None, name='a', listof=False)"
+
+
+def test_variables_cannot_change():
+    var = d_Variable("name")
+    with pytest.raises(AttributeError):
+        var.name = "other"  # type: ignore
+    with pytest.raises(AttributeError):
+        del var.prefix
+    assert var.name == "name" and var.prefix == ()
+
+
+def test_variables_with_equal_names_are_equal():
+    # Built from a string that isn't the same object as the one scope_key has
+    built = d_Variable("".join(["sha", "red"]))
+    shared = scope_key("shared")
+    assert built == shared and hash(built) == hash(shared)
+    assert scope_key("shared") is shared
+    assert {built: 1}[shared] == 1
+    assert pickle.loads(pickle.dumps(built)) == shared
+    class_ = _run("class A {||}").find_attr("A")
+    prefixed = d_Variable("shared", (class_,))  # type: ignore
+    assert prefixed != shared
+    assert prefixed == d_Variable("shared", (class_,))  # type: ignore